@@ -1,9 +1,123 @@
+import contextlib
+import functools
+import io
 import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Tuple, Union
 
 from lightshow.lighting_language import *
 
+# Size of the output file buffer, large enough that the OS sees ~MB writes rather than one per row
+_OUTPUT_BUFFER_SIZE = 1 << 20
+# Number of frames that are sampled from the lightshow at once, which bounds how many frames are held in memory
+_FRAMES_PER_BATCH = 1024
+# Rows are appended into a single reused buffer, which is flushed to the file once it grows past this size
+_ROW_BUFFER_FLUSH_SIZE = 128 << 10
+# Ascii decimal strings for every possible h/s/v byte, so cells are never formatted one integer at a time
+_BYTE_STRINGS = tuple(b"%d" % i for i in range(256))
+_SEPARATOR = b","
+_NEWLINE = b"\n"
+# h,s,v cells of a light that is turned off
+_OFF_CELLS = b"0,0,0"
+# Number of chunks of frames given to each worker process when compiling in parallel
+_CHUNKS_PER_PROCESS = 4
 
-def compile_to_csv(lightshow: LightShow, frequency: float, output_file_path: str, universe: int = 0) -> None:
+# (lightshow, timestamps, universe_lights_and_prefixes) being compiled in parallel. This is set right before the worker
+# processes are forked so that they inherit it, since shows often hold closures that cannot be pickled.
+_parallel_compile_state = None
+
+
+def _hsv_to_csv_cells(hsv: HSV) -> bytes:
+    """
+    :return: the "h,s,v" csv cells for <hsv>, with values as integers out of 255
+        (uncontrolled values are treated as zero)
+    """
+    # uncontrolled (None) values fall through the `or` to zero. Values are clamped into the table rather than relying
+    # on HSV's range check (which is skipped under python -O), since a negative index would silently write a wrong byte
+    return _SEPARATOR.join((_BYTE_STRINGS[min(max(int((hsv.h or 0) * 255), 0), 255)],
+                            _BYTE_STRINGS[min(max(int((hsv.s or 0) * 255), 0), 255)],
+                            _BYTE_STRINGS[min(max(int((hsv.v or 0) * 255), 0), 255)]))
+
+
+@functools.lru_cache(maxsize=16)
+def _make_row_writer(universe_lights_and_prefixes: Tuple[Tuple[Light, bytes], ...]) -> Callable:
+    """
+    Generates the function used to append the cells for a single frame onto the row buffer. The loop over
+    <universe_lights_and_prefixes> is unrolled, with each light's prefix baked into the generated code as a constant,
+    so that no per-light loop or formatting work is left to do at compile time. Generated writers are cached, since
+    the same show is often compiled repeatedly.
+
+    :return: a function write_row(rows, lighting_info, previous_lighting_info, converted_hsvs), where converted_hsvs
+        is a dict used to memoize the csv cells of each distinct HSV object in the frame
+    """
+    namespace = {"_hsv_to_csv_cells": _hsv_to_csv_cells}
+    source_lines = ["def write_row(rows, lighting_info, previous_lighting_info, converted_hsvs):",
+                    "    get_info = lighting_info.get"]
+
+    for i, (light, light_prefix) in enumerate(universe_lights_and_prefixes):
+        namespace[f"light_{i}"] = light
+        source_lines += [
+            f"    hsv_info = get_info(light_{i})",
+            "    if hsv_info is not None:",
+            "        hsv = hsv_info.hsv",
+            "        hsv_cells = converted_hsvs.get(id(hsv))",
+            "        if hsv_cells is None:",
+            "            hsv_cells = converted_hsvs[id(hsv)] = _hsv_to_csv_cells(hsv)",
+            f"        rows += {light_prefix!r}",
+            "        rows += hsv_cells",
+            # the light stopped being controlled since the last frame, so it gets turned off
+            f"    elif light_{i} in previous_lighting_info:",
+            f"        rows += {light_prefix + _OFF_CELLS!r}",
+        ]
+
+    exec("\n".join(source_lines), namespace)
+    return namespace["write_row"]
+
+
+def _write_rows(lightshow: LightShow,
+                timestamps: List[int],
+                universe_lights_and_prefixes: Tuple[Tuple[Light, bytes], ...],
+                previous_lighting_info: LightingInfoType,
+                output_file) -> None:
+    """
+    Writes the csv rows for <timestamps> to <output_file>
+    :param previous_lighting_info: the lighting info of the frame before timestamps[0] (used to turn lights off)
+    """
+    write_row = _make_row_writer(universe_lights_and_prefixes)
+    rows = bytearray()
+    for batch_start in range(0, len(timestamps), _FRAMES_PER_BATCH):
+        batch_timestamps = timestamps[batch_start:batch_start + _FRAMES_PER_BATCH]
+        for timestamp, lighting_info in zip(batch_timestamps, lightshow.get_infos_at(batch_timestamps)):
+            rows += b"%d" % timestamp
+            # lights commonly share the same HSV object, so each distinct one is only converted once per frame
+            write_row(rows, lighting_info, previous_lighting_info, {})
+            previous_lighting_info = lighting_info
+            rows += _NEWLINE
+
+            if len(rows) >= _ROW_BUFFER_FLUSH_SIZE:
+                output_file.write(rows)
+                rows.clear()
+
+    output_file.write(rows)
+
+
+def _render_rows_in_worker(chunk_start: int, chunk_end: int) -> bytes:
+    """
+    Renders the csv rows for timestamps[chunk_start:chunk_end] of the show being compiled in parallel
+    """
+    lightshow, timestamps, universe_lights_and_prefixes = _parallel_compile_state
+    previous_lighting_info = lightshow.get_info_at(timestamps[chunk_start - 1]) if chunk_start > 0 else {}
+
+    output = io.BytesIO()
+    _write_rows(lightshow, timestamps[chunk_start:chunk_end], universe_lights_and_prefixes,
+                previous_lighting_info, output)
+    return output.getvalue()
+
+
+def compile_to_csv(lightshow: LightShow, frequency: float, output_file_path: Union[str, os.PathLike, BinaryIO],
+                   universe: int = 0, processes: Optional[int] = None) -> None:
     """
     Outputs csv of the form:
     note that h,s, and v are integers out of 255 in the output here
@@ -12,56 +126,58 @@ def compile_to_csv(lightshow: LightShow, frequency: float, output_file_path: str
     <timestamp in millis>,lightNumber,h,s,v,lightNumber,h,s,v,.....
 
     :param universe: the lights for which we want to control in this universe
-    :param output_file_path:
+    :param output_file_path: the path of the file to write, or a binary file-like object (i.e. io.BytesIO) to write
+        the csv into, which is left open
     :param frequency: the frequency (in hz) that we want to compile the lightshow to
     :param lightshow: the lightshow that we are compiling into a csv
+    :param processes: if given, the number of worker processes used to compute frames in parallel. Workers are
+        forked (so that the show does not need to be picklable), so this falls back to compiling in the current
+        process on platforms without fork.
     """
+    global _parallel_compile_state
 
     max_time = math.ceil(lightshow.end)
     start_time = math.floor(lightshow.start)
 
-    all_lights = lightshow.all_lights
-
-    with open(output_file_path, "w") as output_file:
-        t = start_time
-        last_lighting_info = None
-        while t < max_time:
-            timestamp = int(t)  # round
-            output_file.write(f'{timestamp}')
-            t += 1000.0 / frequency
-            lighting_info = lightshow.get_info_at(timestamp)
-            for light, hsv_info in lighting_info.items():
-                if light.universe != universe:
-                    continue
-
-                h = hsv_info.hsv.h
-                s = hsv_info.hsv.s
-                v = hsv_info.hsv.v
-
-                if h is None:
-                    h = 0
-                if s is None:
-                    s = 0
-                if v is None:
-                    v = 0
-
-                h = int(h * 255)
-                s = int(s * 255)
-                v = int(v * 255)
-
-                output_file.write(f',{light.light_number},{h},{s},{v}')
-
-            if last_lighting_info is not None:
-                for light in all_lights:
-                    if light not in lighting_info and light in last_lighting_info and light.universe == universe:
-                        output_file.write(f',{light.light_number},{0},{0},{0}')
-
-            last_lighting_info = lighting_info
-            output_file.write("\n")
-
-        output_file.write(str(max_time))
-        for light in all_lights:
-            if light.universe == universe:
-                output_file.write(f',{light.light_number},{0},{0},{0}')
-
-        output_file.write("\n")
+    # only lights in the requested universe can ever show up in the output, so filter them once up front. Each light is
+    # paired with the ",<light number>," prefix of its cells, so light numbers are only looked up and formatted once.
+    universe_lights_and_prefixes = tuple((light, _SEPARATOR + b"%d" % light.light_number + _SEPARATOR)
+                                         for light in lightshow.all_lights if light.universe == universe)
+
+    # timestamps are computed from the frame index rather than accumulated, so they don't drift over long shows.
+    # When the frequency is a whole number of hz, this is done entirely with exact integer arithmetic.
+    if float(frequency).is_integer():
+        frequency = int(frequency)
+        number_of_frames = -(-(max_time - start_time) * frequency // 1000)  # ceil
+        timestamps = [start_time + frame * 1000 // frequency for frame in range(number_of_frames)]
+    else:
+        frame_time = 1000.0 / frequency
+        number_of_frames = math.ceil((max_time - start_time) / frame_time)
+        timestamps = [math.floor(start_time + frame * frame_time) for frame in range(number_of_frames)]
+
+    # the final row turns every light in the universe off
+    all_lights_off_cells = b"".join(light_prefix + _OFF_CELLS for _, light_prefix in universe_lights_and_prefixes)
+
+    # the output is pure ascii, so it is written in binary mode to skip the text encoding layer entirely
+    if isinstance(output_file_path, (str, os.PathLike)):
+        output = open(output_file_path, "wb", buffering=_OUTPUT_BUFFER_SIZE)
+    else:
+        output = contextlib.nullcontext(output_file_path)
+
+    with output as output_file:
+        if processes is not None and processes > 1 and "fork" in multiprocessing.get_all_start_methods():
+            chunk_size = max(1, math.ceil(number_of_frames / (processes * _CHUNKS_PER_PROCESS)))
+            chunk_starts = range(0, number_of_frames, chunk_size)
+            chunk_ends = [min(chunk_start + chunk_size, number_of_frames) for chunk_start in chunk_starts]
+
+            _parallel_compile_state = (lightshow, timestamps, universe_lights_and_prefixes)
+            try:
+                with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("fork")) as executor:
+                    for rows in executor.map(_render_rows_in_worker, chunk_starts, chunk_ends):
+                        output_file.write(rows)
+            finally:
+                _parallel_compile_state = None
+        else:
+            _write_rows(lightshow, timestamps, universe_lights_and_prefixes, {}, output_file)
+
+        output_file.write(b"%d" % max_time + all_lights_off_cells + _NEWLINE)
@@ -1,8 +1,15 @@
 from lightshow.core.types import *
-from typing import Any, Set, Optional, Iterable, Tuple, List, Callable
+from typing import Any, Dict, Set, Optional, Iterable, Tuple, List, Callable, Sequence
 import colorsys
 import bisect
+import collections
+from functools import cached_property
+import hashlib
+import json
+import os
+import tempfile
 import lightshow.core.utils as utils
+from lightshow.core.utils import resolve_two_infos
 
 
 class Fade(LightShow):
@@ -11,16 +18,45 @@ class Fade(LightShow):
     of [0,self.length)
 
     Uses RGB Interpolation when all of h,s, and v values are given, otherwise uses linear interpolation
+
+    For performance purposes, the info at each point of the fade is memoized (exactly, by how far into the fade the
+    point is), so that repeated samples (i.e. when the fade is repeated, or compiled again) reuse it
     """
 
+    # Maximum number of memoized infos before starting over
+    _MAX_CACHED_INFOS = 1 << 12
+
+    # These never change, so they are plain attributes (set in __init__) rather than properties, saving a descriptor
+    # call on every access
+    length: float = 0
+    start: float = 0
+    end: float = 0
+    all_lights: Set[Light] = frozenset()
+
     def __init__(self, length: float, lights: Set[Light], start_value: HSV, end_value: HSV):
         super(Fade, self).__init__()
         self._length = length
-        self._lights = lights.copy()
+        # immutable, so that it can be shared with callers of all_lights rather than copied
+        self._lights = frozenset(lights)
+        # the lights are iterated over on every sample, which is faster for a tuple than a set
+        self._lights_iter = tuple(self._lights)
+        self.length = length
+        self.start = 0
+        self.end = length
+        self.all_lights = self._lights
         self._start_value = start_value
         self._end_value = end_value
         self._rep_is_valid_check()
         self._interpolate_rgb = start_value.h is not None and start_value.s is not None and start_value.v is not None
+        # the endpoints never change, so they are only converted to rgb once
+        if self._interpolate_rgb:
+            self._start_rgb = Fade._hsv_to_rgb_value(start_value)
+            self._end_rgb = Fade._hsv_to_rgb_value(end_value)
+        # a fade between equal values is constant, so it always gives its start value exactly (interpolating would
+        # only add rounding noise)
+        self._constant_info = HSVInfo(start_value) if start_value == end_value else None
+        # maps the percentage of the start value (see _percentage_start_at) to the info at that point of the fade
+        self._info_by_percentage: Dict[float, HSVInfo] = {}
 
     def _rep_is_valid_check(self) -> None:
         count_not_controlled = 0
@@ -70,19 +106,17 @@ class Fade(LightShow):
         :return: a tuple of r,g,b
         """
 
-        return colorsys.rgb_to_hsv(r, g, b)
-
-    def get_info_at(self, timestamp: float) -> LightingInfoType:
-        lighting_info = dict()
-        if not self.start <= timestamp <= self.end:
-            return lighting_info
-
-        start_delta = timestamp - self.start
-        percentage_start = 1.0 - start_delta / self.length
+        return utils.rgb_to_hsv(r, g, b)
 
+    def _info_at_percentage(self, percentage_start: float) -> HSVInfo:
+        """
+        Private method to compute the info of the fade at a point in it
+        :param percentage_start: how much of the start value (as opposed to the end value) to use, in [0, 1]
+        :return: the info that every light in the fade has at that point
+        """
         if self._interpolate_rgb:
-            start_r, start_g, start_b = Fade._hsv_to_rgb_value(self._start_value)
-            end_r, end_g, end_b = Fade._hsv_to_rgb_value(self._end_value)
+            start_r, start_g, start_b = self._start_rgb
+            end_r, end_g, end_b = self._end_rgb
 
             output_r = percentage_start * start_r + (1.0 - percentage_start) * end_r
             output_g = percentage_start * start_g + (1.0 - percentage_start) * end_g
@@ -90,10 +124,7 @@ class Fade(LightShow):
 
             h, s, v = Fade._rgb_to_hsv_value(output_r, output_g, output_b)
 
-            for light in self._lights:
-                lighting_info[light] = HSVInfo(HSV(h, s, v))
-
-            return lighting_info
+            return HSVInfo(HSV(h, s, v))
 
         else:
             h = None
@@ -107,80 +138,119 @@ class Fade(LightShow):
             if self._start_value.v is not None:
                 v = percentage_start * self._start_value.v + (1.0 - percentage_start) * self._end_value.v
 
-            for light in self._lights:
-                lighting_info[light] = HSVInfo(HSV(h, s, v))
+            return HSVInfo(HSV(h, s, v))
 
-            return lighting_info
+    def _percentage_start_at(self, timestamp: float) -> float:
+        """
+        Private method to compute how far into the fade a timestamp is
+        :param timestamp: a timestamp in [self.start, self.end]
+        :return: how much of the start value (as opposed to the end value) to use at <timestamp>, in [0, 1]
+        """
+        # zero length fades only ever sample their start value
+        if self._length == 0:
+            return 1.0
 
-    @property
-    def length(self) -> float:
-        return self._length
+        return 1.0 - (timestamp - self.start) / self._length
 
-    @property
-    def start(self) -> float:
-        return 0
+    def _info_at(self, timestamp: float) -> HSVInfo:
+        """
+        Private method to get the (memoized) info of the fade at a timestamp
+        :param timestamp: a timestamp in [self.start, self.end]
+        :return: the info that every light in the fade has at <timestamp>
+        """
+        if self._constant_info is not None:
+            return self._constant_info
+
+        percentage_start = self._percentage_start_at(timestamp)
+        info = self._info_by_percentage.get(percentage_start)
+        if info is None:
+            if len(self._info_by_percentage) >= Fade._MAX_CACHED_INFOS:
+                self._info_by_percentage.clear()
+            info = self._info_at_percentage(percentage_start)
+            self._info_by_percentage[percentage_start] = info
+        return info
 
-    @property
-    def end(self) -> float:
-        return self.length
+    def get_info_at(self, timestamp: float) -> LightingInfoType:
+        if not self.start <= timestamp <= self.end:
+            return dict()
 
-    @property
-    def all_lights(self) -> Set[Light]:
-        return self._lights.copy()
+        # every light has the same value, so they all share a single (immutable) info object
+        return dict.fromkeys(self._lights_iter, self._info_at(timestamp))
+
+    def get_infos_at(self, timestamps: Sequence[float]) -> List[LightingInfoType]:
+        start = self.start
+        end = self.end
+        lights = self._lights_iter
+        info_at = self._info_at
+
+        output = []
+        for timestamp in timestamps:
+            if start <= timestamp <= end:
+                output.append(dict.fromkeys(lights, info_at(timestamp)))
+            else:
+                output.append(dict())
 
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        return output
+
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
         return self
 
 
 class Strobe(LightShow):
 
+    # As in Fade, these never change, so they are plain attributes rather than properties
+    length: float = 0
+    start: float = 0
+    end: float = 0
+    all_lights: Set[Light] = frozenset()
+
     def __init__(self, lights: Set[Light],
                  hi_value: HSV, lo_value: HSV,
                  time_hi: float, time_lo: float,
                  length: float):
         super(Strobe, self).__init__()
-        self._lights = lights.copy()
+        # immutable, so that it can be shared with callers of all_lights rather than copied
+        self._lights = frozenset(lights)
         self._hi_value = hi_value
         self._lo_value = lo_value
         self._time_hi = time_hi
         self._time_lo = time_lo
         self._length = length
+        self.length = length
+        self.start = 0
+        self.end = length
+        self.all_lights = self._lights
+        self._period = time_hi + time_lo
+        # only two outputs are ever possible, so both are built once and shared between calls (the returned
+        # lighting info must not be modified by callers)
+        self._lights_iter = tuple(self._lights)
+        self._hi_output = dict.fromkeys(self._lights_iter, HSVInfo(hi_value))
+        self._lo_output = dict.fromkeys(self._lights_iter, HSVInfo(lo_value))
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
         if timestamp < self.start or timestamp >= self.end:
             return {}
 
-        time_stamp_in_cycle = timestamp % (self._time_hi + self._time_lo)
+        return self._hi_output if timestamp % self._period < self._time_hi else self._lo_output
 
-        if time_stamp_in_cycle < self._time_hi:
-            hsv = self._hi_value
-        else:
-            hsv = self._lo_value
-
-        output = {}
+    def get_infos_at(self, timestamps: Sequence[float]) -> List[LightingInfoType]:
+        start = self.start
+        end = self.end
+        period = self._period
+        time_hi = self._time_hi
+        hi_output = self._hi_output
+        lo_output = self._lo_output
 
-        for light in self._lights:
-            output[light] = HSVInfo(hsv)
+        output = []
+        for timestamp in timestamps:
+            if timestamp < start or timestamp >= end:
+                output.append({})
+            else:
+                output.append(hi_output if timestamp % period < time_hi else lo_output)
 
         return output
 
-    @property
-    def length(self) -> float:
-        return self._length
-
-    @property
-    def start(self) -> float:
-        return 0
-
-    @property
-    def end(self) -> float:
-        return self.length
-
-    @property
-    def all_lights(self) -> Set[Light]:
-        return self._lights.copy()
-
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
         return self
 
     def __hash__(self):
@@ -201,7 +271,6 @@ class At(LightShow):
         super(At, self).__init__()
         self._lightshow = lightshow
         self._time_offset = time_offset
-        self._audio_cache: Dict[int, LightShow] = {}
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
         return self._lightshow.get_info_at(timestamp - self._time_offset)
@@ -210,28 +279,21 @@ class At(LightShow):
     def length(self) -> float:
         return self._lightshow.length
 
-    @property
+    # the child never changes, so these only need to be computed once
+    @cached_property
     def start(self) -> float:
         return self._lightshow.start + self._time_offset
 
-    @property
+    @cached_property
     def end(self) -> float:
         return self._lightshow.end + self._time_offset
 
-    @property
+    @cached_property
     def all_lights(self) -> Set[Light]:
         return self._lightshow.all_lights
 
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
-        if audio_id is not None and audio_id in self._audio_cache:
-            return self._audio_cache[audio_id]
-
-        with_audio_output = At(self._lightshow.with_audio(audio_id, **kwargs), self._time_offset)
-
-        if audio_id is not None:
-            self._audio_cache[audio_id] = with_audio_output
-
-        return with_audio_output
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        return At(self._lightshow.with_audio(audio_id, **kwargs), self._time_offset)
 
 
 class During(LightShow):
@@ -244,7 +306,6 @@ class During(LightShow):
         self._start = start
         self._end = end
         self._lightshow = lightshow
-        self._audio_cache: Dict[int, LightShow] = {}
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
         if timestamp < self._start or timestamp > self._end:
@@ -264,20 +325,12 @@ class During(LightShow):
     def end(self) -> float:
         return min(self._lightshow.end, self._end)
 
-    @property
+    @cached_property
     def all_lights(self) -> Set[Light]:
         return self._lightshow.all_lights
 
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
-        if audio_id is not None and audio_id in self._audio_cache:
-            return self._audio_cache[audio_id]
-
-        with_audio_output = During(self._start, self._end, self._lightshow.with_audio(audio_id, **kwargs))
-
-        if audio_id is not None:
-            self._audio_cache[audio_id] = with_audio_output
-
-        return with_audio_output
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        return During(self._start, self._end, self._lightshow.with_audio(audio_id, **kwargs))
 
 
 class Together(LightShow):
@@ -289,15 +342,59 @@ class Together(LightShow):
     def __init__(self, lightshows: List[LightShow]):
         super(Together, self).__init__()
         assert len(lightshows) > 0
-        self._lightshows = lightshows.copy()
-        self._audio_cache: Dict[int, LightShow] = {}
+        # Nested Togethers are flattened into this one, so that sampling doesn't have to go through a layer of
+        # Together per level of nesting. This doesn't change the output, since conflicts are resolved per channel
+        # in favor of the earliest show with the highest importance either way
+        self._lightshows = []
+        for lightshow in lightshows:
+            if type(lightshow) is Together:
+                self._lightshows.extend(lightshow._lightshows)
+            else:
+                self._lightshows.append(lightshow)
+
+        # If no two shows can ever control the same light, there are never any conflicts to resolve
+        self._disjoint = True
+        all_lights = set()
+        for lightshow in self._lightshows:
+            lights = lightshow.all_lights
+            if self._disjoint and not all_lights.isdisjoint(lights):
+                self._disjoint = False
+            all_lights |= lights
+        # the shows never change, so their combined lights and bounds only need to be computed once
+        self._all_lights = frozenset(all_lights)
+
+        # Indices of the shows sorted by start time, so that only shows that might be playing at a given timestamp
+        # (those that started at most the longest show length ago) need to be queried
+        self._indices_by_start = sorted(range(len(self._lightshows)), key=lambda i: self._lightshows[i].start)
+        self._sorted_starts = [self._lightshows[i].start for i in self._indices_by_start]
+        self._ends = [lightshow.end for lightshow in self._lightshows]
+        self._max_length = max(lightshow.end - lightshow.start for lightshow in self._lightshows)
+        self._start = self._sorted_starts[0]
+        self._end = max(self._ends)
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
-        from lightshow.core.utils import resolve_two_infos
         total_output = dict[Light, HSVInfo]()
 
-        for lightshow in self._lightshows:
-            potential_info = lightshow.get_info_at(timestamp)
+        start_index = 0
+        if self._max_length != math.inf:
+            start_index = bisect.bisect_left(self._sorted_starts, timestamp - self._max_length)
+        end_index = bisect.bisect_right(self._sorted_starts, timestamp)
+        playing = [i for i in self._indices_by_start[start_index:end_index] if timestamp <= self._ends[i]]
+
+        if self._disjoint:
+            for i in playing:
+                total_output.update(self._lightshows[i].get_info_at(timestamp))
+
+            return total_output
+
+        # conflicts are resolved in favor of earlier shows, so the original order needs to be kept
+        playing.sort()
+        for i in playing:
+            potential_info = self._lightshows[i].get_info_at(timestamp)
+            if total_output.keys().isdisjoint(potential_info.keys()):
+                total_output.update(potential_info)
+                continue
+
             for light, hsv_info in potential_info.items():
                 if light not in total_output:
                     total_output[light] = hsv_info
@@ -314,31 +411,92 @@ class Together(LightShow):
 
     @property
     def start(self) -> float:
-        return min(map(lambda lightshow: lightshow.start, self._lightshows))
+        return self._start
 
     @property
     def end(self) -> float:
-        return max(map(lambda lightshow: lightshow.end, self._lightshows))
+        return self._end
 
     @property
     def all_lights(self) -> Set[Light]:
-        output = set[Light]()
+        return self._all_lights
 
-        for lightshow in self._lightshows:
-            output |= lightshow.all_lights
-        return output
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        return Together(
+            list(map(lambda lightshow: lightshow.with_audio(audio_id, **kwargs), self._lightshows)))
 
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
-        if audio_id is not None and audio_id in self._audio_cache:
-            return self._audio_cache[audio_id]
 
-        with_audio_output = Together(
-            list(map(lambda lightshow: lightshow.with_audio(audio_id, **kwargs), self._lightshows)))
+class ConcatRun(LightShow):
+    """
+    A lightshow that plays the lightshows in <lightshows> one after another, where the ith show is shifted to start
+    at time <offsets>[i] (as in At).
+
+    Equivalent to a Together of each show wrapped in an At, but samples the shows directly, and when only one show is
+    playing at a timestamp (the usual case) returns its output as is rather than copying it into a new map.
+    """
+
+    def __init__(self, lightshows: List[LightShow], offsets: List[float]):
+        super(ConcatRun, self).__init__()
+        assert len(lightshows) > 0
+        assert len(lightshows) == len(offsets)
+        self._lightshows = list(lightshows)
+        self._offsets = list(offsets)
+
+        # the time window that each show plays in, once shifted by its offset
+        starts = [lightshow.start + offset for lightshow, offset in zip(self._lightshows, self._offsets)]
+        self._ends = [lightshow.end + offset for lightshow, offset in zip(self._lightshows, self._offsets)]
+
+        # As in Together, only shows that started at most the longest show length ago need to be queried
+        self._indices_by_start = sorted(range(len(self._lightshows)), key=starts.__getitem__)
+        self._sorted_starts = [starts[i] for i in self._indices_by_start]
+        self._max_length = max(lightshow.end - lightshow.start for lightshow in self._lightshows)
+        self._start = self._sorted_starts[0]
+        self._end = max(self._ends)
+        self._all_lights = frozenset().union(*(lightshow.all_lights for lightshow in self._lightshows))
 
-        if audio_id is not None:
-            self._audio_cache[audio_id] = with_audio_output
+    def get_info_at(self, timestamp: float) -> LightingInfoType:
+        start_index = 0
+        if self._max_length != math.inf:
+            start_index = bisect.bisect_left(self._sorted_starts, timestamp - self._max_length)
+        end_index = bisect.bisect_right(self._sorted_starts, timestamp)
+        playing = [i for i in self._indices_by_start[start_index:end_index] if timestamp <= self._ends[i]]
 
-        return with_audio_output
+        if len(playing) == 1:
+            i = playing[0]
+            return self._lightshows[i].get_info_at(timestamp - self._offsets[i])
+
+        # shows overlap (i.e. right at the boundary between two shows), so resolve conflicts in favor of earlier shows
+        total_output = dict[Light, HSVInfo]()
+        playing.sort()
+        for i in playing:
+            potential_info = self._lightshows[i].get_info_at(timestamp - self._offsets[i])
+            for light, hsv_info in potential_info.items():
+                if light not in total_output:
+                    total_output[light] = hsv_info
+                else:
+                    total_output[light] = resolve_two_infos(total_output[light], hsv_info)
+
+        return total_output
+
+    @property
+    def length(self) -> float:
+        return self.end - self.start
+
+    @property
+    def start(self) -> float:
+        return self._start
+
+    @property
+    def end(self) -> float:
+        return self._end
+
+    @property
+    def all_lights(self) -> Set[Light]:
+        return self._all_lights
+
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        # the offsets are kept as they were, just as the offsets of the equivalent At shows would be
+        return ConcatRun([lightshow.with_audio(audio_id, **kwargs) for lightshow in self._lightshows], self._offsets)
 
 
 class RepeatAt(LightShow):
@@ -349,18 +507,25 @@ class RepeatAt(LightShow):
     def __init__(self, timestamps: Iterable[float], lightshow: LightShow):
         super(RepeatAt, self).__init__()
         self._lightshow = lightshow
-        self._lightshow_length = lightshow.length
+        self._lightshow_start = lightshow.start
+        self._lightshow_end = lightshow.end
         self._timestamps = list(timestamps)
         self._timestamps.sort()
-        self._audio_cache: Dict[int, LightShow] = {}
+
+        # With no repeats, the show is empty
+        self._start = self._timestamps[0] + lightshow.start if self._timestamps else 0
+        self._end = self._timestamps[-1] + lightshow.end if self._timestamps else 0
+        self._all_lights = frozenset(lightshow.all_lights)
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
-        start_index = bisect.bisect_left(self._timestamps, timestamp - self._lightshow_length) - 1
-        end_index = bisect.bisect_right(self._timestamps, timestamp + self._lightshow_length)
+        # The repeat at offset o is playing iff lightshow.start <= timestamp - o <= lightshow.end, so only offsets in
+        # [timestamp - lightshow.end, timestamp - lightshow.start] need to be queried (plus one extra offset on each
+        # side, in case of floating point rounding right at the edges, since the show checks its own bounds anyway)
+        start_index = bisect.bisect_left(self._timestamps, timestamp - self._lightshow_end) - 1
+        end_index = bisect.bisect_right(self._timestamps, timestamp - self._lightshow_start)
 
         start_index = max(0, start_index)
 
-        from lightshow.core.utils import resolve_two_infos
         total_output = dict[Light, HSVInfo]()
 
         for timestamp_off in self._timestamps[start_index:end_index + 1]:
@@ -381,26 +546,18 @@ class RepeatAt(LightShow):
 
     @property
     def start(self) -> float:
-        return min(self._timestamps) + self._lightshow.start
+        return self._start
 
     @property
     def end(self) -> float:
-        return max(self._timestamps) + self._lightshow.end
+        return self._end
 
     @property
     def all_lights(self) -> Set[Light]:
-        return self._lightshow.all_lights
-
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
-        if audio_id is not None and audio_id in self._audio_cache:
-            return self._audio_cache[audio_id]
+        return self._all_lights
 
-        with_audio_output = RepeatAt(self._timestamps, self._lightshow.with_audio(audio_id, **kwargs))
-
-        if audio_id is not None:
-            self._audio_cache[audio_id] = with_audio_output
-
-        return with_audio_output
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        return RepeatAt(self._timestamps, self._lightshow.with_audio(audio_id, **kwargs))
 
 
 class PostModifier(LightShow):
@@ -418,7 +575,6 @@ class PostModifier(LightShow):
         self._lightshow = lightshow
         self._info_modifier = info_modifier
         self._all_lights_modifier = all_lights_modifier
-        self._audio_cache: Dict[int, LightShow] = {}
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
         return self._info_modifier(self._lightshow.get_info_at(timestamp))
@@ -435,21 +591,14 @@ class PostModifier(LightShow):
     def end(self) -> float:
         return self._lightshow.end
 
-    @property
+    # the modified lights only depend on the child (which never changes), so they are only computed once
+    @cached_property
     def all_lights(self) -> Set[Light]:
         return self._all_lights_modifier(self._lightshow.all_lights)
 
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
-        if audio_id is not None and audio_id in self._audio_cache:
-            return self._audio_cache[audio_id]
-
-        with_audio_output = PostModifier(self._lightshow.with_audio(audio_id, **kwargs), self._info_modifier,
-                                         self._all_lights_modifier)
-
-        if audio_id is not None:
-            self._audio_cache[audio_id] = with_audio_output
-
-        return with_audio_output
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        return PostModifier(self._lightshow.with_audio(audio_id, **kwargs), self._info_modifier,
+                            self._all_lights_modifier)
 
 
 class DynamicAtEvents(LightShow):
@@ -462,47 +611,33 @@ class DynamicAtEvents(LightShow):
         super(DynamicAtEvents, self).__init__()
         self._lightshow = lightshow
         self._timestamp_generator = timestamp_generator
-        self._audio_cache: Dict[int, LightShow] = {}
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
         return {}
 
+    # Until audio is attached (with_audio returns a RepeatAt), there are no events, so the show is empty
+
     @property
     def length(self) -> float:
-        if len(self._audio_info) == 0:
-            return 0
-        return self._lightshow_calculator.length
+        return 0
 
     @property
     def start(self) -> float:
-        if len(self._audio_info) > 0:
-            return self._lightshow_calculator.start
         return 0
 
     @property
     def end(self) -> float:
-        if len(self._audio_info) > 0:
-            return self._lightshow_calculator.end
         return 0
 
-    @property
+    @cached_property
     def all_lights(self) -> Set[Light]:
-        if len(self._audio_info) == 0:
-            return set()
-        return self._lightshow_calculator.all_lights
-
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
-        if audio_id is not None and audio_id in self._audio_cache:
-            return self._audio_cache[audio_id]
+        # these are the lights that would be controlled if there were any events
+        return self._lightshow.all_lights
 
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
         times = list(self._timestamp_generator(**kwargs))
         
-        with_audio_output = RepeatAt(times, self._lightshow)
-
-        if audio_id is not None:
-            self._audio_cache[audio_id] = with_audio_output
-
-        return with_audio_output
+        return RepeatAt(times, self._lightshow)
 
 
 class OnShapes(LightShow):
@@ -526,27 +661,21 @@ class OnShapes(LightShow):
         output: LightingInfoType = {}
 
         # for each controlled light, potentially map to its set of output lights
-        for controlled_light in self._controls:
-            shape, lighting_component = self._controls[controlled_light]
-            if controlled_light in lightshow_info:
+        for controlled_light, (shape, lighting_component) in self._controls.items():
+            without_density_info = lightshow_info.get(controlled_light)
+            if without_density_info is not None:
                 # should this have an origin, or make that part of the shape
                 lights_in_shape = lighting_component.get_lights_in_space(shape, Point(0, 0, 0), t=timestamp)
-                for light in lights_in_shape:
-                    without_density_info = lightshow_info[controlled_light]
-                    potential_new_info = HSVInfo(
-                        hsv=HSV(without_density_info.hsv.h,
-                                without_density_info.hsv.s,
-                                without_density_info.hsv.v
-                                if without_density_info.hsv.v is None
-                                else without_density_info.hsv.v * lights_in_shape[light]),
-                        h_importance=without_density_info.h_importance,
-                        s_importance=without_density_info.s_importance,
-                        v_importance=without_density_info.v_importance
-                    )
+                h, s, v = without_density_info.hsv.h, without_density_info.hsv.s, without_density_info.hsv.v
+                h_importance, s_importance, v_importance = without_density_info.h_importance, \
+                    without_density_info.s_importance, without_density_info.v_importance
+                for light, density in lights_in_shape.items():
+                    potential_new_info = HSVInfo(HSV(h, s, v if v is None else v * density),
+                                                 h_importance, s_importance, v_importance)
                     if light in output:
                         # TODO see if there is a refactoring that would make this less repetitive/clunky to code on the
                         # client side
-                        output[light] = utils.resolve_two_infos(output[light], potential_new_info)
+                        output[light] = resolve_two_infos(output[light], potential_new_info)
                         pass
                     else:
                         output[light] = potential_new_info
@@ -565,7 +694,8 @@ class OnShapes(LightShow):
     def end(self) -> float:
         return self._lightshow.end
 
-    @property
+    # the controls never change, so their lights are only gathered once
+    @cached_property
     def all_lights(self) -> Set[Light]:
         all_lights = set()
         for light in self._controls:
@@ -573,7 +703,7 @@ class OnShapes(LightShow):
 
         return all_lights
 
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
         return OnShapes(
             self._lightshow.with_audio(audio_id, **kwargs),
             self._controls
@@ -589,14 +719,19 @@ class StateChangerShow(LightShow):
     def __init__(self, callback_generator: Callable[[float], Any], show_mapping: Dict[Any, LightShow]):
         super(StateChangerShow, self).__init__()
         self._callback_generator = callback_generator
-        self._all_lights = set()
         self._show_mapping = show_mapping.copy()
-        self._audio_cache: Dict[int, LightShow] = {}
-        for show in show_mapping.values():
-            self._all_lights |= show.all_lights
+        self._all_lights = frozenset().union(*(show.all_lights for show in show_mapping.values()))
+
+        # The label usually stays the same across consecutive samples, so the last one is remembered
+        self._last_label: Any = None
+        self._last_get_info_at: Optional[Callable[[float], LightingInfoType]] = None
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
-        return self._show_mapping[self._callback_generator(timestamp)].get_info_at(timestamp)
+        label = self._callback_generator(timestamp)
+        if self._last_get_info_at is None or label != self._last_label:
+            self._last_get_info_at = self._show_mapping[label].get_info_at
+            self._last_label = label
+        return self._last_get_info_at(timestamp)
 
     @property
     def length(self) -> float:
@@ -612,28 +747,20 @@ class StateChangerShow(LightShow):
 
     @property
     def all_lights(self) -> Set[Light]:
-        return self._all_lights.copy()
-
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
-        if audio_id is not None and audio_id in self._audio_cache:
-            return self._audio_cache[audio_id]
+        return self._all_lights
 
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
         new_show_mapping = {}
 
         # Basically update the shows that we are mapping to
         for label in self._show_mapping:
             new_show_mapping[label] = self._show_mapping[label].with_audio(audio_id, **kwargs)
 
-        with_audio_output = StateChangerShow(
+        return StateChangerShow(
             callback_generator=self._callback_generator,
             show_mapping=new_show_mapping,
         )
 
-        if audio_id is not None:
-            self._audio_cache[audio_id] = with_audio_output
-
-        return with_audio_output
-
 
 class Mover(LightShow):
     """
@@ -643,9 +770,14 @@ class Mover(LightShow):
     The shape can also optionally be moved using the <position_controller>, which moves the shape origin as a function
     of time.
 
-    For perfomance purposes, this is only accurate to +- 5ms (so repeat uses of the show can be cached)
+    For perfomance purposes, this is only accurate to +- 5ms (so repeat uses of the show can be cached). The rounding
+    never reaches outside of [start, end] (the bounds of <lightshow>) though, since shows like Together only sample the
+    shows playing at a timestamp
     """
 
+    # Maximum number of outputs kept in the output cache
+    _MAX_CACHED_OUTPUTS = 10000
+
     def __init__(self, lighting_component: LightingComponent, shape: Shape,
                  lightshow: LightShow,
                  generic_light_to_use: Light = Light(0, 0, True),
@@ -659,13 +791,22 @@ class Mover(LightShow):
         self._lightshow = lightshow
         self._position_controller = position_controller
         self._generic_light_to_use = generic_light_to_use
-        self._audio_cache: Dict[int, LightShow] = {}
-        self._output_cache: Dict[int, LightingInfoType] = {}
+        self._start = lightshow.start
+        self._end = lightshow.end
+        # maps timestamp // 10 (rounded) to the output at that time, keeping only the most recently used outputs
+        self._output_cache: collections.OrderedDict[int, LightingInfoType] = collections.OrderedDict()
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
-        timestamp = round(timestamp / 10) * 10
-        if round(timestamp) in self._output_cache:
-            return self._output_cache[round(timestamp)]
+        if timestamp < self._start or timestamp > self._end:
+            return {}
+
+        key = round(timestamp / 10)
+        output_info = self._output_cache.get(key)
+        if output_info is not None:
+            self._output_cache.move_to_end(key)
+            return output_info
+
+        timestamp = key * 10
 
         if self._position_controller is None:
             origin = Point(0, 0, 0)
@@ -675,23 +816,24 @@ class Mover(LightShow):
         output_lights = self._lighting_component.get_lights_in_space(self._shape, origin, timestamp)
         hsv_info = self._lightshow.get_info_at(timestamp)
 
-        output_info = {}
-
-        if self._generic_light_to_use in hsv_info:
-            for output_light in output_lights:
-                old_info = hsv_info[self._generic_light_to_use]
-                if old_info.hsv.v is not None:
-                    # interpolate the value of the output
-                    output_info[output_light] = HSVInfo(hsv=HSV(old_info.hsv.h,
-                                                                old_info.hsv.s,
-                                                                old_info.hsv.v * output_lights[output_light]),
-                                                        h_importance=old_info.h_importance,
-                                                        s_importance=old_info.s_importance,
-                                                        v_importance=old_info.v_importance)
-                else:
-                    output_info[output_light] = old_info
+        old_info = hsv_info.get(self._generic_light_to_use)
+
+        if old_info is None:
+            output_info = {}
+        elif old_info.hsv.v is None:
+            output_info = dict.fromkeys(output_lights, old_info)
+        else:
+            # interpolate the value of the output
+            h, s, v = old_info.hsv.h, old_info.hsv.s, old_info.hsv.v
+            h_importance, s_importance, v_importance = \
+                old_info.h_importance, old_info.s_importance, old_info.v_importance
+            output_info = {output_light: HSVInfo(HSV(h, s, v * density), h_importance, s_importance, v_importance)
+                           for output_light, density in output_lights.items()}
+
+        self._output_cache[key] = output_info
+        if len(self._output_cache) > Mover._MAX_CACHED_OUTPUTS:
+            self._output_cache.popitem(last=False)
 
-        self._output_cache[round(timestamp)] = output_info
         return output_info
 
     @property
@@ -700,30 +842,170 @@ class Mover(LightShow):
 
     @property
     def start(self) -> float:
-        return self._lightshow.start
+        return self._start
 
     @property
     def end(self) -> float:
-        return self._lightshow.end
+        return self._end
 
-    @property
+    @cached_property
     def all_lights(self) -> Set[Light]:
         return self._lighting_component.all_lights_in_component()
 
-    def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
-        if audio_id is not None and audio_id in self._audio_cache:
-            return self._audio_cache[audio_id]
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        return Mover(self._lighting_component,
+                     self._shape,
+                     self._lightshow.with_audio(audio_id, **kwargs),
+                     self._generic_light_to_use,
+                     self._position_controller)
+
+
+class Cached(LightShow):
+    """
+    A lightshow that plays <lightshow>, but only samples it at timestamps that are a multiple of <quantum> (rounding to
+    the nearest one), caching the most recently used outputs.
+
+    This is useful for wrapping expensive shows (i.e. large Together/RepeatAt/OnShapes trees) that are sampled at a
+    higher rate, or more often, than they need to be accurate to. Like Mover, it is only accurate to +- quantum/2 ms,
+    and outputs nothing outside of [start, end] (the bounds of <lightshow>)
+    """
+
+    def __init__(self, lightshow: LightShow, quantum: float = 10, max_entries: int = 4096):
+        super(Cached, self).__init__()
+        assert quantum > 0 and max_entries > 0
+        self._lightshow = lightshow
+        self._quantum = quantum
+        self._max_entries = max_entries
+        self._start = lightshow.start
+        self._end = lightshow.end
+        self._output_cache: collections.OrderedDict[int, LightingInfoType] = collections.OrderedDict()
+
+    def get_info_at(self, timestamp: float) -> LightingInfoType:
+        if timestamp < self._start or timestamp > self._end:
+            return {}
+
+        key = round(timestamp / self._quantum)
+
+        output = self._output_cache.get(key)
+        if output is not None:
+            self._output_cache.move_to_end(key)
+            return output
+
+        output = self._lightshow.get_info_at(key * self._quantum)
+
+        self._output_cache[key] = output
+        if len(self._output_cache) > self._max_entries:
+            self._output_cache.popitem(last=False)
+
+        return output
+
+    @property
+    def length(self) -> float:
+        return self._lightshow.length
+
+    @property
+    def start(self) -> float:
+        return self._start
+
+    @property
+    def end(self) -> float:
+        return self._end
+
+    @cached_property
+    def all_lights(self) -> Set[Light]:
+        return self._lightshow.all_lights
+
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        return Cached(self._lightshow.with_audio(audio_id, **kwargs), self._quantum, self._max_entries)
+
+
+# Where album art palettes are cached on disk. Can be relocated with the LIGHTSHOW_PALETTE_CACHE environment
+# variable, and setting it to the empty string disables the cache
+_DEFAULT_PALETTE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "lightshow", "palettes.json")
+
+
+def _palette_cache_path() -> Optional[str]:
+    """
+    :return: the path of the palette cache file, or None if the cache is disabled
+    """
+    return os.environ.get("LIGHTSHOW_PALETTE_CACHE", _DEFAULT_PALETTE_CACHE_PATH) or None
 
-        with_audio_output = Mover(self._lighting_component,
-                                  self._shape,
-                                  self._lightshow.with_audio(audio_id, **kwargs),
-                                  self._generic_light_to_use,
-                                  self._position_controller)
 
-        if audio_id is not None:
-            self._audio_cache[audio_id] = with_audio_output
+def _load_palettes(cache_path: Optional[str]) -> Dict[str, List[Tuple[float, float, float]]]:
+    if cache_path is None:
+        return {}
+    try:
+        with open(cache_path) as cache_file:
+            palettes = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    return palettes if isinstance(palettes, dict) else {}
 
-        return with_audio_output
+
+def _save_palettes(cache_path: Optional[str], palettes: Dict[str, List[Tuple[float, float, float]]]) -> None:
+    """
+    Writes <palettes> to <cache_path> atomically (via a temporary file in the same directory), so that
+    concurrent readers never see a partially written cache
+    """
+    if cache_path is None:
+        return
+    temp_path = None
+    try:
+        cache_dir = os.path.dirname(os.path.abspath(cache_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, prefix=".palettes-", suffix=".tmp")
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump(palettes, cache_file)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # the cache is only an optimization
+        if temp_path is not None:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def _get_album_palette(album_cover_url: str) -> List[Tuple[float, float, float]]:
+    """
+    Returns the hsv values of the 3 most dominant colors in the album art at <album_cover_url>
+
+    Palettes are cached on disk (see _palette_cache_path), keyed by the url, since finding
+    them requires downloading and quantizing the image
+    """
+    cache_path = _palette_cache_path()
+    palettes = _load_palettes(cache_path)
+    palette_key = hashlib.sha1(album_cover_url.encode()).hexdigest()
+    if palette_key in palettes:
+        return [tuple(hsv) for hsv in palettes[palette_key]]
+
+    import requests
+    from PIL import Image
+
+    album_cover = Image.open(requests.get(
+                                album_cover_url,
+                                stream=True).raw)
+    # the dominant colors of a small copy are the same, and quantizing it is far cheaper
+    album_cover.thumbnail((64, 64))
+    palette_img = album_cover.quantize(3, kmeans=3)
+
+    # Find the colors that occurs most often
+    palette = palette_img.getpalette()
+    color_counts = sorted(palette_img.getcolors(), reverse=True)
+    colors_hsv = []
+
+    for i in range(3):
+        palette_index = color_counts[i][1]
+        dominant_color = palette[palette_index * 3:palette_index * 3 + 3]
+        colors_hsv.append(
+            colorsys.rgb_to_hsv(
+                dominant_color[0] / 255,
+                dominant_color[1] / 255,
+                dominant_color[2] / 255))
+
+    palettes[palette_key] = colors_hsv
+    _save_palettes(cache_path, palettes)
+    return colors_hsv
 
 
 class WithAlbumArtColors(LightShow):
@@ -737,56 +1019,34 @@ class WithAlbumArtColors(LightShow):
         super(WithAlbumArtColors, self).__init__()
         self._lightshows = lightshows.copy()
         self._album_url_kwarg = album_url_kwarg
-        self._with_audio_cache: Dict[int, LightShow] = {}
+
+        self._length = max(lightshow.length for lightshow in self._lightshows)
+        self._start = min(lightshow.start for lightshow in self._lightshows)
+        self._end = max(lightshow.end for lightshow in self._lightshows)
+        self._all_lights = frozenset().union(*(lightshow.all_lights for lightshow in self._lightshows))
 
     def get_info_at(self, timestamp: float) -> LightingInfoType:
         return self._post_modifier.get_info_at(timestamp)
 
     @property
     def length(self) -> float:
-        return max(map(lambda lightshow: lightshow.length, self._lightshows))
+        return self._length
 
     @property
     def start(self) -> float:
-        return min(map(lambda lightshow: lightshow.start, self._lightshows))
+        return self._start
 
     @property
     def end(self) -> float:
-        return max(map(lambda lightshow: lightshow.end, self._lightshows))
+        return self._end
 
     @property
     def all_lights(self) -> Set[Light]:
-        output = set()
-        for lightshow in self._lightshows:
-            output |= lightshow.all_lights
-        return output
-
-    def with_audio(self,audio_id:Optional[int]=None,**kwargs)->LightShow:
-        if audio_id in self._with_audio_cache:
-            return self._with_audio_cache[audio_id]
-
-        import requests
-        from PIL import Image
+        return self._all_lights
 
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
         album_cover_url = kwargs.get(self._album_url_kwarg)
-        album_cover = Image.open(requests.get(
-                                    album_cover_url,
-                                    stream=True).raw)
-        palette_img = album_cover.quantize(3, kmeans=3)
-
-        # Find the colors that occurs most often
-        palette = palette_img.getpalette()
-        color_counts = sorted(palette_img.getcolors(), reverse=True)
-        colors_hsv = []
-
-        for i in range(3):
-            palette_index = color_counts[i][1]
-            dominant_color = palette[palette_index * 3:palette_index * 3 + 3]
-            colors_hsv.append(
-                colorsys.rgb_to_hsv(
-                    dominant_color[0] / 255,
-                    dominant_color[1] / 255,
-                    dominant_color[2] / 255))
+        colors_hsv = _get_album_palette(album_cover_url)
 
         album_color_covers = list(map(lambda hsv: 
                                     HSV(hsv[0],
@@ -796,19 +1056,15 @@ class WithAlbumArtColors(LightShow):
         # Function for creating the various PostModifier functions
         def info_modifier_factory(index: int) -> Callable[[LightingInfoType],
                                                            LightingInfoType]:
+            album_color = album_color_covers[index % len(album_color_covers)]
+            h, s = album_color.h, album_color.s
+
             def info_modifier(old_info: LightingInfoType) -> LightingInfoType:
-                new_info: LightingInfoType = {}
-                index = index % len(album_color_covers)
-                for light, info in old_info.items():
-                    new_info[light] = HSVInfo(
-                        hsv=HSV(album_color_covers[index].h,
-                                album_color_covers[index].s,
-                                info.hsv.v),
-                        h_importance=info.h_importance,
-                        s_importance=info.s_importance,
-                        v_importance=info.v_importance
-                    )
-                return new_info
+                return {light: HSVInfo(hsv=HSV(h, s, info.hsv.v),
+                                       h_importance=info.h_importance,
+                                       s_importance=info.s_importance,
+                                       v_importance=info.v_importance)
+                        for light, info in old_info.items()}
 
             return info_modifier
 
@@ -823,7 +1079,4 @@ class WithAlbumArtColors(LightShow):
                 )
             )
 
-        new_output = Together(together_list)
-
-        self._with_audio_cache[audio_id] = new_output
-        return new_output
+        return Together(together_list)
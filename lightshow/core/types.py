@@ -1,51 +1,32 @@
 # This file contains the interfaces and record types used in the package
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Set
+from dataclasses import dataclass
+from typing import Any, Hashable, NamedTuple, Optional, Dict, Set, List, Sequence
 import math
+import os
 
 
-class HSV:
+class _HSVFields(NamedTuple):
+    h: Optional[float]
+    s: Optional[float]
+    v: Optional[float]
+
+
+class HSV(_HSVFields):
     """
     Immutable type representing HSV values
     """
+    # A NamedTuple (allocated on every sample of most shows), so that field access, equality and hashing are all
+    # done in C, and there is no __dict__
+    __slots__ = ()
 
-    def __init__(self,
-                 h: Optional[float],
-                 s: Optional[float],
-                 v: Optional[float]):
-        assert all(map(lambda x: x is None or 0 <= x <= 1, [h, s, v]))
-        self._h = h
-        self._s = s
-        self._v = v
-
-    # Using properties to reduce likelihood that we accidentally modify HSV values.
-    @property
-    def h(self) -> Optional[float]:
-        return self._h
-
-    @property
-    def s(self) -> Optional[float]:
-        return self._s
-
-    @property
-    def v(self) -> Optional[float]:
-        return self._v
-
-    def __eq__(self, other):
-        return isinstance(other, HSV) \
-            and self.h == other.h \
-            and self.s == other.s \
-            and self.v == other.v
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
+    def __new__(cls, h: Optional[float], s: Optional[float], v: Optional[float]):
+        assert (h is None or 0 <= h <= 1) and (s is None or 0 <= s <= 1) and (v is None or 0 <= v <= 1)
+        return tuple.__new__(cls, (h, s, v))
 
-    def __hash__(self) -> int:
-        return hash((self.h, self.s, self.v))
 
-
-class HSVInfo:
+class HSVInfo(NamedTuple):
     """
     Immutable.
 
@@ -53,95 +34,43 @@ class HSVInfo:
 
     By default, importance is zero.
     """
-
-    def __init__(self,
-                 hsv: HSV,
-                 h_importance: int = 0,
-                 s_importance: int = 0,
-                 v_importance: int = 0):
-        self._hsv = hsv
-        self._h_importance = h_importance
-        self._s_importance = s_importance
-        self._v_importance = v_importance
-
-    @property
-    def h_importance(self) -> int:
-        return self._h_importance
-
-    @property
-    def s_importance(self) -> int:
-        return self._s_importance
-
-    @property
-    def v_importance(self) -> int:
-        return self._v_importance
-
-    @property
-    def hsv(self) -> HSV:
-        return self._hsv
-
-    def __eq__(self, other):
-        return isinstance(other, HSVInfo) \
-            and self.hsv == other.hsv \
-            and self.h_importance == other.h_importance \
-            and self.s_importance == other.s_importance \
-            and self.v_importance == other.v_importance
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
-
-    def __hash__(self) -> int:
-        return hash((self.hsv, self.h_importance, self.s_importance, self.v_importance))
+    hsv: HSV
+    h_importance: int = 0
+    s_importance: int = 0
+    v_importance: int = 0
 
 
+@dataclass(frozen=True)
 class Light:
     """
     Represents a Light Object, which has a lightNumber
 
     """
-
-    def __init__(self, light_number: int, universe: int = 0, is_generic: bool = False):
-        self._light_number = light_number
-        self._universe = universe
-        self._is_generic = is_generic
-
-    @property
-    def light_number(self) -> int:
-        return self._light_number
-
-    @property
-    def universe(self) -> int:
-        return self._universe
-
-    @property
-    def is_generic(self) -> bool:
-        return self._is_generic
-
-    def __eq__(self, other):
-        return isinstance(other,
-                          Light) and other.light_number == self.light_number and other.universe == self.universe \
-            and other.is_generic == self.is_generic
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
-
-    def __hash__(self):
-        return hash((self.light_number, self.universe))
+    light_number: int
+    universe: int = 0
+    is_generic: bool = False
 
 
 # Maps each light to its corresponding info
 LightingInfoType = Dict[Light, HSVInfo]
 
+# Whether LightShow.total_objects_created is kept up to date
+_DEBUG_COUNT_SHOWS = bool(os.environ.get("LIGHTSHOW_DEBUG_COUNT"))
+
 
 class LightShow(ABC):
     """
     Immutable type representing light shows
     """
+    # Only counted when the LIGHTSHOW_DEBUG_COUNT environment variable is set, since it is only used for debugging
     total_objects_created = 0
 
     def __init__(self):
         super(LightShow, self).__init__()
-        LightShow.total_objects_created += 1
+        if _DEBUG_COUNT_SHOWS:
+            LightShow.total_objects_created += 1
+        # maps the audio cache key of a with_audio call to its output
+        self._audio_cache: Dict[Hashable, LightShow] = {}
 
     @abstractmethod
     def get_info_at(self, timestamp: float) -> LightingInfoType:
@@ -151,11 +80,22 @@ class LightShow(ABC):
         :return: lighting info with the HSV value (in [0,1]) of the given light index (as controlled by this LightShow).
             IFF the light is not controlled by the show at that timestamp for one or more of the H/S/V values, that
             value will be None in the value.
+            The returned map may be shared between calls (and between shows), so it must not be modified.
 
         i.e. If we get back a map that has Light(5) -> {h:.5,
         """
         pass
 
+    def get_infos_at(self, timestamps: Sequence[float]) -> List[LightingInfoType]:
+        """
+        Batched version of get_info_at, useful when sampling a show at many timestamps at once (i.e. when compiling).
+        Subclasses can override this if they are able to compute many samples more efficiently than one at a time.
+        :param timestamps: the timestamps that we want the information for (in milliseconds)
+        :return: a list where the ith element is equal to get_info_at(timestamps[i])
+        """
+        get_info_at = self.get_info_at
+        return [get_info_at(timestamp) for timestamp in timestamps]
+
     @property
     @abstractmethod
     def length(self) -> float:
@@ -190,16 +130,17 @@ class LightShow(ABC):
         (lights may not actually be controlled, but sometimes functions are structured abstractly in a case that we
         cannot know that; i.e. at every beat, but what if there are no beats? We may still return all lights controlled
         if there were a beat).
+        The returned set may be shared with the show, so it must not be modified (callers that need a mutable set
+        should copy it with set(show.all_lights)).
         """
         pass
 
-    @abstractmethod
     def with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
         """
         Returns a new lightshow with the audio attached to it
         This only affects shows who depend on audio
-        :param audio_id: the audio id of the information that we want to use (used for caching). If None, then no
-            caching is used.
+        :param audio_id: the audio id of the information that we want to use (used for caching, along with the
+            kwargs). If None, then no caching is used.
         :param kwargs; maps audio metadata label to information needed by audio callbacks.
             This information is generally up to the client, but needs to be consistent:
                 I.e. if we have drum midi file at "./drum_file.mid", we might have a callback that expects
@@ -207,35 +148,52 @@ class LightShow(ABC):
         :return: the lightshow with the audio metadata incorporated. Note that this doesn't necessarily keep the
             structure the same (i.e. calling with_audio on the new audio might not generate the expected LightShow)
         """
-        pass
+        key = _audio_cache_key(audio_id, kwargs)
+        if key is None:
+            return self._build_with_audio(audio_id, **kwargs)
+        if key in self._audio_cache:
+            return self._audio_cache[key]
+
+        with_audio_output = self._build_with_audio(audio_id, **kwargs)
+        self._audio_cache[key] = with_audio_output
+        return with_audio_output
 
+    def _build_with_audio(self, audio_id: Optional[int] = None, **kwargs) -> LightShow:
+        """
+        Builds the output of with_audio (which takes care of caching it), with the same parameters and return value.
+        Subclasses should override this (rather than with_audio) to get caching for free; subclasses written before
+        this existed override with_audio directly instead, which still works (just without the caching)
+
+        By default, the show doesn't depend on audio, so it is returned as is
+        """
+        return self
+
+
+def _audio_cache_key(audio_id: Optional[int], kwargs: Dict[str, Any]) -> Optional[Hashable]:
+    """
+    Returns the key that the output of with_audio(audio_id, **kwargs) is cached under, or None if it
+    shouldn't be cached (when there is no audio id, or some of the kwargs aren't hashable)
+    """
+    if audio_id is None:
+        return None
+    key = (audio_id, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
 
-class Point:
-    def __init__(self, x: float = 0, y: float = 0, z: float = 0):
-        self.x = x
-        self.y = y
-        self.z = z
 
-    def __eq__(self, other):
-        return isinstance(other, Point) \
-            and self.x == other.x \
-            and self.y == other.y \
-            and self.z == other.z
+class Point(NamedTuple):
+    x: float = 0
+    y: float = 0
+    z: float = 0
 
     def minus(self, other: Point) -> Point:
         return Point(self.x - other.x, self.y - other.y, self.z - other.z)
 
     def distance_to(self, other: Point):
-        dx = self.x - other.x
-        dy = self.y - other.y
-        dz = self.z - other.z
-        return math.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
-
-    def __hash__(self) -> int:
-        return hash((self.x, self.y, self.z))
+        return math.hypot(self.x - other.x, self.y - other.y, self.z - other.z)
 
 
 class Shape(ABC):
@@ -256,6 +214,22 @@ class Shape(ABC):
         """
         pass
 
+    def points_in_shape(self, xs: Sequence[float], ys: Sequence[float], zs: Sequence[float],
+                        t: float = 0) -> List[tuple[bool, float]]:
+        """
+        Batched version of point_in_shape, useful when querying many points at once (i.e. the lights of a strip).
+        The points are given as separate sequences of coordinates, so that they can be looped over without building
+        or unpacking a Point for each one.
+        Subclasses can override this if they are able to check many points more efficiently than one at a time.
+        :param xs: the x coordinate of each point to check
+        :param ys: the y coordinate of each point to check
+        :param zs: the z coordinate of each point to check
+        :param t: the time that we want the shape information at
+        :return: a list where the ith element is equal to point_in_shape(Point(xs[i], ys[i], zs[i]), t)
+        """
+        point_in_shape = self.point_in_shape
+        return [point_in_shape(Point(x, y, z), t) for x, y, z in zip(xs, ys, zs)]
+
     @abstractmethod
     def bounding_cube(self) -> Cube:
         """
@@ -263,6 +237,14 @@ class Shape(ABC):
         """
         pass
 
+    def bounding_cube_at(self, t: float) -> Cube:
+        """
+        Shapes that change with time can override this to return a tighter cube than bounding_cube()
+        :param t: the time that the returned cube needs to bound the shape at
+        :return: a bounding cube of the shape at time t
+        """
+        return self.bounding_cube()
+
 
 class Cube(Shape):
     """
@@ -281,6 +263,21 @@ class Cube(Shape):
         self.y2 = max(p1.y, p2.y)
         self.z2 = max(p1.z, p2.z)
 
+    @classmethod
+    def from_bounds(cls, x1: float, y1: float, z1: float, x2: float, y2: float, z2: float) -> Cube:
+        """
+        Creates the cube directly from its bounds, without building points or reordering the bounds
+        (so requires x1 <= x2, y1 <= y2, and z1 <= z2)
+        """
+        cube = cls.__new__(cls)
+        cube.x1 = x1
+        cube.y1 = y1
+        cube.z1 = z1
+        cube.x2 = x2
+        cube.y2 = y2
+        cube.z2 = z2
+        return cube
+
     def point_in_shape(self, p: Point, t: float = 0) -> tuple[bool, float]:
         if self.x1 <= p.x <= self.x2 and \
                 self.y1 <= p.y <= self.y2 and \
@@ -289,6 +286,12 @@ class Cube(Shape):
 
         return False, 0
 
+    def points_in_shape(self, xs: Sequence[float], ys: Sequence[float], zs: Sequence[float],
+                        t: float = 0) -> List[tuple[bool, float]]:
+        x1, y1, z1, x2, y2, z2 = self.x1, self.y1, self.z1, self.x2, self.y2, self.z2
+        return [(True, 1) if x1 <= x <= x2 and y1 <= y <= y2 and z1 <= z <= z2 else (False, 0)
+                for x, y, z in zip(xs, ys, zs)]
+
     def bounding_cube(self) -> Cube:
         return self
 
@@ -316,4 +319,8 @@ class LightingComponent(ABC):
 
     @abstractmethod
     def all_lights_in_component(self) -> Set[Light]:
+        """
+        :return: all the lights in the component. The returned set may be shared with the component, so it must not
+            be modified.
+        """
         pass
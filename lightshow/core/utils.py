@@ -1,4 +1,5 @@
 from lightshow.core.types import HSV, HSVInfo, LightingInfoType
+from typing import Tuple
 import math
 
 
@@ -10,29 +11,26 @@ def resolve_two_infos(hsv_info_1: HSVInfo, hsv_info_2: HSVInfo) -> HSVInfo:
     :param hsv_info_2:
     :return:
     """
-    output_h = hsv_info_2.hsv.h
-    output_s = hsv_info_2.hsv.s
-    output_v = hsv_info_2.hsv.v
-    output_h_importance = hsv_info_2.h_importance
-    output_s_importance = hsv_info_2.s_importance
-    output_v_importance = hsv_info_2.v_importance
+    hsv_1, h_importance_1, s_importance_1, v_importance_1 = hsv_info_1
+    hsv_2, h_importance_2, s_importance_2, v_importance_2 = hsv_info_2
 
-    if hsv_info_1.h_importance >= hsv_info_2.h_importance:
-        output_h = hsv_info_1.hsv.h
-        output_h_importance = hsv_info_1.h_importance
+    # whether each of h, s and v comes from hsv_info_1 (used as an index into (hsv_info_2's, hsv_info_1's) values)
+    pick_h = h_importance_1 >= h_importance_2
+    pick_s = s_importance_1 >= s_importance_2
+    pick_v = v_importance_1 >= v_importance_2
 
-    if hsv_info_1.s_importance >= hsv_info_2.s_importance:
-        output_s = hsv_info_1.hsv.s
-        output_s_importance = hsv_info_1.s_importance
+    # one info wins everything far more often than not, in which case it can be returned as is
+    if pick_h and pick_s and pick_v:
+        return hsv_info_1
+    if not (pick_h or pick_s or pick_v):
+        return hsv_info_2
 
-    if hsv_info_1.v_importance >= hsv_info_2.v_importance:
-        output_v = hsv_info_1.hsv.v
-        output_v_importance = hsv_info_1.v_importance
-
-    return HSVInfo(HSV(output_h, output_s, output_v),
-                   output_h_importance,
-                   output_s_importance,
-                   output_v_importance)
+    return HSVInfo(HSV((hsv_2.h, hsv_1.h)[pick_h],
+                       (hsv_2.s, hsv_1.s)[pick_s],
+                       (hsv_2.v, hsv_1.v)[pick_v]),
+                   (h_importance_2, h_importance_1)[pick_h],
+                   (s_importance_2, s_importance_1)[pick_s],
+                   (v_importance_2, v_importance_1)[pick_v])
 
 
 def importance_modifier(old_infos: LightingInfoType, importance) -> LightingInfoType:
@@ -43,12 +41,22 @@ def importance_modifier(old_infos: LightingInfoType, importance) -> LightingInfo
     :return: new lighting info, where all non-None hsv values have {hsv}Importance = <importance>
     """
     new_infos = dict()
+    # lights usually share their info (i.e. all the lights of a fade), so each distinct info is only replaced once
+    new_info_by_old_id = dict()
 
     for light, hsv_info in old_infos.items():
-        new_info = HSVInfo(hsv_info.hsv,
-                           h_importance=importance,
-                           s_importance=importance,
-                           v_importance=importance)
+        new_info = new_info_by_old_id.get(id(hsv_info))
+        if new_info is None:
+            if hsv_info.h_importance == importance \
+                    and hsv_info.s_importance == importance \
+                    and hsv_info.v_importance == importance:
+                new_info = hsv_info
+            else:
+                new_info = HSVInfo(hsv_info.hsv,
+                                   h_importance=importance,
+                                   s_importance=importance,
+                                   v_importance=importance)
+            new_info_by_old_id[id(hsv_info)] = new_info
         new_infos[light] = new_info
 
     return new_infos
@@ -66,3 +74,29 @@ def linear_on_zero_one(x: float, cycle_length=2 * math.pi) -> float:
 
     out = 1 - abs(in_cycle - cycle_length / 2) / (cycle_length / 2)
     return out
+
+
+def rgb_to_hsv(r: float, g: float, b: float) -> Tuple[float, float, float]:
+    """
+    Equivalent to colorsys.rgb_to_hsv, but computes the hue directly from whichever channel is the max,
+    so only a single division is needed for it (rather than one per channel)
+    :param r: red in [0,1]
+    :param g: green in [0,1]
+    :param b: blue in [0,1]
+    :return: a tuple of h,s,v (all in [0,1])
+    """
+    max_c = max(r, g, b)
+    min_c = min(r, g, b)
+    range_c = max_c - min_c
+
+    if range_c == 0:
+        return 0.0, 0.0, max_c
+
+    if r == max_c:
+        h = (g - b) / range_c
+    elif g == max_c:
+        h = 2.0 + (b - r) / range_c
+    else:
+        h = 4.0 + (r - g) / range_c
+
+    return (h / 6.0) % 1.0, range_c / max_c, max_c
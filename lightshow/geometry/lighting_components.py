@@ -10,19 +10,27 @@ class SingleLight(LightingComponent):
         super(SingleLight, self).__init__()
         self._light = light
         self._location = location
+        self._all_lights = frozenset((light,))
 
     def get_lights_in_space(self, shape: Shape, origin: Point, t: float = 0) -> Dict[Light, float]:
         if self._location is None:
             return dict()
 
-        point_in_shape, density = shape.point_in_shape(self._location.minus(origin), t)
+        location = self._location.minus(origin)
+        # points outside of the bounding cube can't be in the shape, which is much cheaper to check
+        cube = shape.bounding_cube_at(t)
+        if not (cube.x1 <= location.x <= cube.x2 and cube.y1 <= location.y <= cube.y2
+                and cube.z1 <= location.z <= cube.z2):
+            return dict()
+
+        point_in_shape, density = shape.point_in_shape(location, t)
         if point_in_shape:
             return {self._light: density}
 
         return dict()
 
     def all_lights_in_component(self) -> Set[Light]:
-        return {self._light}
+        return self._all_lights
 
 
 class LightStrip(LightingComponent):
@@ -57,25 +65,56 @@ class LightStrip(LightingComponent):
         assert self.start_location != self.end_location
 
         self._lights = lights.copy()
+        self._all_lights = frozenset(self._lights)
 
-    def get_lights_in_space(self, shape: Shape, origin: Point, t: float = 0) -> Dict[Light, float]:
-        output = dict()
+        # The strip never moves, so the position of each light is only computed once. The coordinates are kept in
+        # separate tuples, which is what Shape.points_in_shape takes
+        ratios_end = [i / (len(self._lights) - 1) if len(self._lights) > 1 else 0 for i in range(len(self._lights))]
+        self._xs = tuple(self.start_location.x * (1 - ratio_end) + self.end_location.x * ratio_end
+                         for ratio_end in ratios_end)
+        self._ys = tuple(self.start_location.y * (1 - ratio_end) + self.end_location.y * ratio_end
+                         for ratio_end in ratios_end)
+        self._zs = tuple(self.start_location.z * (1 - ratio_end) + self.end_location.z * ratio_end
+                         for ratio_end in ratios_end)
 
-        for i in range(len(self._lights)):
-            light = self._lights[i]
-            ratio_end = i / (len(self._lights) - 1)
-            point_to_query = Point(x=self.start_location.x * (1 - ratio_end) + self.end_location.x * ratio_end,
-                                   y=self.start_location.y * (1 - ratio_end) + self.end_location.y * ratio_end,
-                                   z=self.start_location.z * (1 - ratio_end) + self.end_location.z * ratio_end)
+        # The bounds of the strip, so that shapes nowhere near it can be rejected without looking at any lights
+        self._min_x, self._max_x = min(self._xs, default=0), max(self._xs, default=0)
+        self._min_y, self._max_y = min(self._ys, default=0), max(self._ys, default=0)
+        self._min_z, self._max_z = min(self._zs, default=0), max(self._zs, default=0)
 
-            point_in_shape, density = shape.point_in_shape(point_to_query.minus(origin), t)
-            if point_in_shape:
-                output[light] = density
+        self._strip_length = self.start_location.distance_to(self.end_location)
+
+    def get_lights_in_space(self, shape: Shape, origin: Point, t: float = 0) -> Dict[Light, float]:
+        ox, oy, oz = origin
+        cube = shape.bounding_cube_at(t)
+        x1, y1, z1, x2, y2, z2 = cube.x1, cube.y1, cube.z1, cube.x2, cube.y2, cube.z2
+        if self._max_x - ox < x1 or self._min_x - ox > x2 \
+                or self._max_y - oy < y1 or self._min_y - oy > y2 \
+                or self._max_z - oz < z1 or self._min_z - oz > z2:
+            return dict()
 
-        return output
+        lights, xs, ys, zs = self._lights, self._xs, self._ys, self._zs
+        if origin != (0, 0, 0):
+            xs = [x - ox for x in xs]
+            ys = [y - oy for y in ys]
+            zs = [z - oz for z in zs]
+
+        # only the lights in the bounding cube can be in the shape, so only those are given to it
+        indices = [i for i, (x, y, z) in enumerate(zip(xs, ys, zs))
+                   if x1 <= x <= x2 and y1 <= y <= y2 and z1 <= z <= z2]
+        if len(indices) < len(lights):
+            lights = [lights[i] for i in indices]
+            xs = [xs[i] for i in indices]
+            ys = [ys[i] for i in indices]
+            zs = [zs[i] for i in indices]
+
+        # all the lights are checked in a single batch, so that shapes can do so without a call per light
+        return {light: density
+                for light, (point_in_shape, density) in zip(lights, shape.points_in_shape(xs, ys, zs, t))
+                if point_in_shape}
 
     def all_lights_in_component(self) -> Set[Light]:
-        return set(self._lights)
+        return self._all_lights
 
     @property
     def strip_length(self):
@@ -83,11 +122,7 @@ class LightStrip(LightingComponent):
         Euclidean distance from self.start_location to start.end_location
         :return: The length of the strip in space
         """
-        dx = self.end_location.x - self.start_location.x
-        dy = self.end_location.y - self.start_location.y
-        dz = self.end_location.z - self.start_location.z
-
-        return math.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
+        return self._strip_length
 
 class LightingComponentGroup(LightingComponent):
     """
@@ -97,24 +132,25 @@ class LightingComponentGroup(LightingComponent):
     def __init__(self, components: Iterable[LightingComponent]):
         super(LightingComponentGroup, self).__init__()
         self._components = list(components)
+        # the components never change, so neither do their lights
+        self._all_lights = frozenset().union(*(component.all_lights_in_component()
+                                               for component in self._components))
 
     def get_lights_in_space(self, shape: Shape, origin: Point, t: float = 0) -> Dict[Light, float]:
         all_lights_in_space = dict()
 
         for component in self._components:
             lights_in_space = component.get_lights_in_space(shape, origin, t)
-            for light in lights_in_space:
-                if light not in all_lights_in_space:
-                    all_lights_in_space[light] = lights_in_space[light]
-                else:
-                    all_lights_in_space[light] = max(lights_in_space[light], all_lights_in_space[light])
+            if all_lights_in_space.keys().isdisjoint(lights_in_space.keys()):
+                all_lights_in_space.update(lights_in_space)
+                continue
+
+            for light, density in lights_in_space.items():
+                current_density = all_lights_in_space.get(light)
+                if current_density is None or density > current_density:
+                    all_lights_in_space[light] = density
 
         return all_lights_in_space
 
     def all_lights_in_component(self) -> Set[Light]:
-        all_lights_in_component = set()
-
-        for component in self._components:
-            all_lights_in_component |= component.all_lights_in_component()
-
-        return all_lights_in_component
\ No newline at end of file
+        return self._all_lights
\ No newline at end of file
@@ -1,35 +1,92 @@
 from lightshow.core.types import *
-from typing import List
-import lightshow.core.utils as utils
+from typing import List, Sequence
+
+
+def _sphere_density(px: float, py: float, pz: float,
+                    ox: float, oy: float, oz: float,
+                    radius: float, squared_radius: float) -> tuple[bool, float]:
+    """
+    Numeric kernel of Sphere.point_in_shape, on raw floats (so that no Point objects or methods are involved)
+    :param squared_radius: radius * radius, which callers keep alongside the radius rather than computing per point
+    :return: whether (px, py, pz) is in the sphere of <radius> around (ox, oy, oz), and its density if so
+    """
+    dx = px - ox
+    dy = py - oy
+    dz = pz - oz
+    # most points are outside of the sphere, so the distance is compared squared, only taking the sqrt when inside
+    squared_delta_to_point = dx * dx + dy * dy + dz * dz
+    if squared_delta_to_point > squared_radius:
+        return False, 0
+
+    return True, 1 - math.sqrt(squared_delta_to_point) / radius
+
+
+def _sphere_densities(xs: Sequence[float], ys: Sequence[float], zs: Sequence[float],
+                      ox: float, oy: float, oz: float,
+                      radius: float, squared_radius: float) -> List[tuple[bool, float]]:
+    """
+    Batched version of _sphere_density, with the kernel inlined so that there is no call per point
+    """
+    output = []
+    for x, y, z in zip(xs, ys, zs):
+        dx = x - ox
+        dy = y - oy
+        dz = z - oz
+        squared_delta_to_point = dx * dx + dy * dy + dz * dz
+        if squared_delta_to_point > squared_radius:
+            output.append((False, 0))
+        else:
+            output.append((True, 1 - math.sqrt(squared_delta_to_point) / radius))
+
+    return output
+
 
 class Sphere(Shape):
 
     def __init__(self, radius: float, origin: Point = Point(0, 0, 0)):
         super(Sphere, self).__init__()
         self._radius = radius
+        self._squared_radius = radius * radius
         self._origin = origin
-        self._bounding_cube = Cube(Point(origin.x - radius,
-                                         origin.y - radius,
-                                         origin.z - radius),
-                                   Point(origin.x + radius,
-                                         origin.y + radius,
-                                         origin.z + radius)
-                                   )
+        self._ox = origin.x
+        self._oy = origin.y
+        self._oz = origin.z
+        self._bounding_cube = Cube.from_bounds(origin.x - radius, origin.y - radius, origin.z - radius,
+                                               origin.x + radius, origin.y + radius, origin.z + radius)
 
     def point_in_shape(self, p: Point, t: float = 0) -> tuple[bool, float]:
-        delta_to_point = p.distance_to(self._origin)
-        if delta_to_point > self._radius:
-            return False, 0
+        return _sphere_density(p.x, p.y, p.z, self._ox, self._oy, self._oz, self._radius, self._squared_radius)
 
-        solid_radius = self._radius * 0
+    def points_in_shape(self, xs: Sequence[float], ys: Sequence[float], zs: Sequence[float],
+                        t: float = 0) -> List[tuple[bool, float]]:
+        return _sphere_densities(xs, ys, zs, self._ox, self._oy, self._oz, self._radius, self._squared_radius)
 
-        if delta_to_point < solid_radius:
-            return True, 1
+    def bounding_cube(self) -> Cube:
+        return self._bounding_cube
 
-        return True, 1 - (delta_to_point - solid_radius) / (self._radius - solid_radius)
 
-    def bounding_cube(self, t: float = 0) -> Cube:
-        return self._bounding_cube
+def _spheres_density(spheres: Sequence[tuple[float, float, float, float, float]],
+                     x: float, y: float, z: float) -> tuple[bool, float]:
+    """
+    Equivalent to the point_in_shape of the union of a list of spheres, with each sphere given as a plain
+    (ox, oy, oz, squared_radius, radius) tuple so that there is no method call or attribute lookup per sphere
+    :return: whether (x, y, z) is in any of the spheres, and the highest density of it in them if so
+    """
+    in_shape = False
+    density = 0
+    for ox, oy, oz, squared_radius, radius in spheres:
+        dx = x - ox
+        dy = y - oy
+        dz = z - oz
+        squared_delta_to_point = dx * dx + dy * dy + dz * dz
+        if squared_delta_to_point <= squared_radius:
+            sphere_density = 1 - math.sqrt(squared_delta_to_point) / radius
+            if sphere_density == 1:
+                return True, 1
+            in_shape = True
+            density = max(sphere_density, density)
+
+    return in_shape, density
 
 
 class CompositeShape(Shape):
@@ -45,28 +102,23 @@ class CompositeShape(Shape):
         :param shapes:
         """
         assert len(shapes) > 0
-        min_x = math.inf
-        min_y = math.inf
-        min_z = math.inf
-        max_x = -math.inf
-        max_y = -math.inf
-        max_z = -math.inf
-
-        for shape in shapes:
-            bounding_cube = shape.bounding_cube()
-            min_x = min(min_x, bounding_cube.x1)
-            min_y = min(min_y, bounding_cube.y1)
-            min_z = min(min_z, bounding_cube.z1)
-
-            max_x = max(max_x, bounding_cube.x2)
-            max_y = max(max_y, bounding_cube.y2)
-            max_z = max(max_z, bounding_cube.z2)
-
-        self._bounding_cube = Cube(Point(min_x, min_y, min_z),
-                                   Point(max_x, max_y, max_z))
+        bounding_cubes = [shape.bounding_cube() for shape in shapes]
+        self._bounding_cube = Cube.from_bounds(min(cube.x1 for cube in bounding_cubes),
+                                               min(cube.y1 for cube in bounding_cubes),
+                                               min(cube.z1 for cube in bounding_cubes),
+                                               max(cube.x2 for cube in bounding_cubes),
+                                               max(cube.y2 for cube in bounding_cubes),
+                                               max(cube.z2 for cube in bounding_cubes))
 
         self._shapes = shapes.copy()
 
+        # The union of spheres is by far the most common composite shape, so for it the spheres are kept as plain
+        # tuples and checked directly by _spheres_density
+        self._spheres: Optional[tuple[tuple[float, float, float, float, float], ...]] = None
+        if all(type(shape) is Sphere for shape in shapes):
+            self._spheres = tuple((shape._ox, shape._oy, shape._oz, shape._squared_radius, shape._radius)
+                                  for shape in shapes)
+
     def point_in_shape(self, p: Point, t: float = 0) -> tuple[bool, float]:
         if p.x < self._bounding_cube.x1 \
                 or p.x > self._bounding_cube.x2 \
@@ -76,6 +128,9 @@ class CompositeShape(Shape):
                 or p.z > self._bounding_cube.z2:
             return False, 0
 
+        if self._spheres is not None:
+            return _spheres_density(self._spheres, p.x, p.y, p.z)
+
         output_is_in_shape = False
         output_density = 0
         for shape in self._shapes:
@@ -88,6 +143,44 @@ class CompositeShape(Shape):
 
         return output_is_in_shape, output_density
 
+    def points_in_shape(self, xs: Sequence[float], ys: Sequence[float], zs: Sequence[float],
+                        t: float = 0) -> List[tuple[bool, float]]:
+        cube = self._bounding_cube
+        x1, y1, z1, x2, y2, z2 = cube.x1, cube.y1, cube.z1, cube.x2, cube.y2, cube.z2
+
+        output: List[tuple[bool, float]] = [(False, 0)] * len(xs)
+
+        # Only points in the bounding cube need to be given to the shapes, and once a point has a density of 1 it
+        # can't get any more in the shape, so it doesn't need to be given to the rest of the shapes
+        candidate_indices = [i for i, (x, y, z) in enumerate(zip(xs, ys, zs))
+                             if x1 <= x <= x2 and y1 <= y <= y2 and z1 <= z <= z2]
+
+        if self._spheres is not None:
+            spheres = self._spheres
+            for i in candidate_indices:
+                output[i] = _spheres_density(spheres, xs[i], ys[i], zs[i])
+            return output
+
+        for shape in self._shapes:
+            if not candidate_indices:
+                break
+
+            remaining_indices = []
+            results = shape.points_in_shape([xs[i] for i in candidate_indices],
+                                            [ys[i] for i in candidate_indices],
+                                            [zs[i] for i in candidate_indices],
+                                            t)
+            for i, (is_in_shape, density) in zip(candidate_indices, results):
+                if is_in_shape:
+                    if density == 1:
+                        output[i] = (True, 1)
+                        continue
+                    output[i] = (True, max(density, output[i][1]))
+                remaining_indices.append(i)
+            candidate_indices = remaining_indices
+
+        return output
+
     def bounding_cube(self) -> Cube:
         return self._bounding_cube
 
@@ -105,29 +198,60 @@ class GrowingAndShrinkingSphere(Shape):
         self._max_radius = max_radius
         self._min_radius = min_radius
         self._cycle_length = cycle_length
+        self._half_cycle_length = cycle_length / 2
         self._origin = origin
-        self._bounding_cube = Cube(
-            origin.minus(Point(max_radius, max_radius, max_radius)),
-            origin.minus(Point(-max_radius, -max_radius, -max_radius))
-        )
-
-    def point_in_shape(self, p: Point, t: float = 0) -> tuple[bool, float]:
-        delta_to_point = p.distance_to(self._origin)
-        t = t + self._cycle_length/2
+        self._ox = origin.x
+        self._oy = origin.y
+        self._oz = origin.z
+        self._bounding_cube = GrowingAndShrinkingSphere._cube_around(origin, max_radius)
+        # Lighting components check bounding_cube_at(t) before querying the shape at the same t (and every component
+        # of a group queries the same t), so the last radius and cube are kept rather than computed again
+        self._radius_t: Optional[float] = None
+        self._radius = 0.0
+        self._squared_radius = 0.0
+        self._cube_t: Optional[float] = None
+        self._cube_at_t = self._bounding_cube
 
-        current_radius = self._min_radius + \
-                         (utils.linear_on_zero_one(t*2* math.pi/self._cycle_length))*\
-                         (self._max_radius - self._min_radius)
+    def _current_radius(self, t: float) -> float:
+        """
+        :return: the radius of the sphere at time t
+        """
+        if t == self._radius_t:
+            return self._radius
 
-        if delta_to_point > current_radius:
-            return False, 0
+        # utils.linear_on_zero_one((t + cycle_length / 2) * 2 * math.pi / cycle_length), inlined. The division by the
+        # cycle length is kept (rather than folded into a constant), so that the radius is exactly max_radius at the
+        # start of each cycle
+        in_cycle = ((t + self._half_cycle_length) * 2 * math.pi / self._cycle_length) % (2 * math.pi)
+        radius = self._min_radius + (1 - abs(in_cycle - math.pi) / math.pi) * (self._max_radius - self._min_radius)
+        self._radius_t = t
+        self._radius = radius
+        self._squared_radius = radius * radius
+        return radius
 
-        solid_radius = current_radius * 0
+    def point_in_shape(self, p: Point, t: float = 0) -> tuple[bool, float]:
+        radius = self._current_radius(t)
+        return _sphere_density(p.x, p.y, p.z, self._ox, self._oy, self._oz, radius, self._squared_radius)
 
-        if delta_to_point < solid_radius:
-            return True, 1
+    def points_in_shape(self, xs: Sequence[float], ys: Sequence[float], zs: Sequence[float],
+                        t: float = 0) -> List[tuple[bool, float]]:
+        # the radius is the same for every point, so it is only computed once
+        radius = self._current_radius(t)
+        return _sphere_densities(xs, ys, zs, self._ox, self._oy, self._oz, radius, self._squared_radius)
 
-        return True, 1-(delta_to_point-solid_radius)/(current_radius-solid_radius)
+    @staticmethod
+    def _cube_around(origin: Point, radius: float) -> Cube:
+        """
+        :return: the cube bounding the sphere of <radius> around <origin>
+        """
+        return Cube.from_bounds(origin.x - radius, origin.y - radius, origin.z - radius,
+                                origin.x + radius, origin.y + radius, origin.z + radius)
 
     def bounding_cube(self) -> Cube:
-        return self._bounding_cube
\ No newline at end of file
+        return self._bounding_cube
+
+    def bounding_cube_at(self, t: float) -> Cube:
+        if t != self._cube_t:
+            self._cube_at_t = GrowingAndShrinkingSphere._cube_around(self._origin, self._current_radius(t))
+            self._cube_t = t
+        return self._cube_at_t
\ No newline at end of file
@@ -1,8 +1,9 @@
 from lightshow.core.types import *
 from lightshow.core.lightshows import During, Fade, Together, PostModifier, RepeatAt, DynamicAtEvents, At, Strobe, OnShapes, \
-    Mover
-from typing import Iterable, Optional, Callable
+    Mover, Cached, ConcatRun
+from typing import Dict, Iterable, Optional, Callable, Tuple
 from lightshow.core.utils import resolve_two_infos, importance_modifier, linear_on_zero_one
+import os
 
 
 def at(time_offset: float, lightshow: LightShow) -> LightShow:
@@ -22,6 +23,16 @@ def during(start: float, end: float, lightshow:float) -> LightShow:
     return During(start, end, lightshow)
 
 
+def cached(lightshow: LightShow, quantum: float = 10) -> LightShow:
+    """
+    Caches the output of an expensive lightshow by only sampling it on a grid of <quantum> millis
+    :param lightshow: the lightshow to cache
+    :param quantum: the spacing (in millis) of the timestamps that the show is sampled at
+    :return: a lightshow that plays <lightshow>, accurate to +- quantum/2 millis
+    """
+    return Cached(lightshow, quantum)
+
+
 def together(lightshows: Iterable[LightShow]) -> LightShow:
     """
     A lightshow that plays all the lightshows in the input <lightshows> together at once, in a single lightshow,
@@ -82,7 +93,7 @@ def strobe(high_value: HSV, low_value: HSV, length: float,
     assert (time_high is not None and time_low is not None) or frequency is not None
 
     if lights is None:
-        lights = Light(0, 0, is_generic=True)
+        lights = {Light(0, 0, is_generic=True)}
 
     if frequency is not None:
         half_cycle_time_millis = (1000.0 / frequency) / 2.0
@@ -151,16 +162,15 @@ def concat(lightshows: Iterable[LightShow]) -> LightShow:
     :return: a new lightshow that plays all the lightshows in <lightshows> one after another
     """
     total_offset = 0
-    together_list = []
+    lightshow_list = []
+    offsets = []
 
     for lightshow in lightshows:
-        if total_offset == 0:
-            together_list.append(lightshow)
-        else:
-            together_list.append(at(total_offset, lightshow))
+        lightshow_list.append(lightshow)
+        offsets.append(total_offset)
         total_offset += lightshow.length
 
-    return together(together_list)
+    return ConcatRun(lightshow_list, offsets)
 
 
 def on_component(component: LightingComponent, lightshow: LightShow, control_light: Light = Light(0, is_generic=True)):
@@ -188,6 +198,45 @@ def on_component(component: LightingComponent, lightshow: LightShow, control_lig
     )
 
 
+# midi file -> (mtime it was parsed at, pitch -> start times in millis of the first instrument's notes)
+_midi_note_starts_cache: Dict[str, Tuple[float, Dict[int, Tuple[float, ...]]]] = {}
+
+
+def _midi_note_starts_by_pitch(midi_file: str) -> Dict[int, Tuple[float, ...]]:
+    """
+    Parses the midi file, only re-parsing it if it has changed since the last call
+    :param midi_file: the location of the midi file
+    :return: a dict from pitch to the start times, in millis, of the first instrument's notes with that pitch
+    """
+    mtime = os.path.getmtime(midi_file)
+    cached = _midi_note_starts_cache.get(midi_file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    # symusic parses in C++ and is much faster than pretty_midi, so prefer it when it is installed
+    try:
+        import symusic
+    except ImportError:
+        symusic = None
+
+    starts_by_pitch: Dict[int, list] = {}
+    if symusic is not None:
+        score = symusic.Score(midi_file, ttype="second")
+        if len(score.tracks) != 0:
+            for note in score.tracks[0].notes:
+                starts_by_pitch.setdefault(note.pitch, []).append(note.time * 1000)
+    else:
+        import pretty_midi
+        midi = pretty_midi.PrettyMIDI(midi_file)
+        if len(midi.instruments) != 0:
+            for note in midi.instruments[0].notes:
+                starts_by_pitch.setdefault(note.pitch, []).append(note.start * 1000)
+
+    note_starts = {note_pitch: tuple(starts) for note_pitch, starts in starts_by_pitch.items()}
+    _midi_note_starts_cache[midi_file] = (mtime, note_starts)
+    return note_starts
+
+
 def on_midi(midi_file_kwarg: str,
             light_show_on_midi: LightShow,
             pitch: int) -> LightShow:
@@ -203,20 +252,7 @@ def on_midi(midi_file_kwarg: str,
     def scheduler(**kwargs) -> Iterable[float]:
         assert midi_file_kwarg in kwargs
 
-        import pretty_midi
-        midi_file = kwargs[midi_file_kwarg]
-        midi = pretty_midi.PrettyMIDI(midi_file)
-
-        output = []
-
-        if len(midi.instruments) == 0:
-            return []
-
-        for note in midi.instruments[0].notes:
-            if note.pitch == pitch:
-                output.append(note.start * 1000)
-
-        return output
+        return _midi_note_starts_by_pitch(kwargs[midi_file_kwarg]).get(pitch, ())
 
     return DynamicAtEvents(
         lightshow=light_show_on_midi,
@@ -244,14 +280,20 @@ def on_shape(shape: Shape, lighting_component: LightingComponent, lightshow: Lig
 def back_and_forth(start_location: Point, end_location: Point, time_to_move: float, shape: Shape,
                    lightshow: LightShow, lighting_component: LightingComponent,
                    control_light: Light = Light(0, 0, True)) -> LightShow:
-    def position_controller(timestamp: float) -> Point:
-        ratio_start = linear_on_zero_one(timestamp * math.pi * 2 / time_to_move)
+    # these are constant, so they are computed/unpacked once rather than on every call of the controller.
+    # The division by time_to_move is kept (rather than folded into the constant), so that the turning points land
+    # exactly on multiples of time_to_move / 2
+    two_pi = math.pi * 2
+    start_x, start_y, start_z = start_location
+    end_x, end_y, end_z = end_location
 
-        origin = Point(x=(1 - ratio_start) * start_location.x + ratio_start * end_location.x,
-                       y=(1 - ratio_start) * start_location.y + ratio_start * end_location.y,
-                       z=(1 - ratio_start) * start_location.z + ratio_start * end_location.z)
+    def position_controller(timestamp: float) -> Point:
+        ratio_start = linear_on_zero_one(timestamp * two_pi / time_to_move)
+        ratio_end = 1 - ratio_start
 
-        return origin
+        return Point(ratio_end * start_x + ratio_start * end_x,
+                     ratio_end * start_y + ratio_start * end_y,
+                     ratio_end * start_z + ratio_start * end_z)
 
     return Mover(   
         lighting_component=lighting_component,
@@ -2,19 +2,48 @@ from lightshow.lighting_language import *
 import pyglet
 import pyglet.shapes as shapes
 import time
-import colorsys
+from typing import Dict, Tuple
 from lightshow.core.utils import *
 
 
+# For each sector of the hue (int(h * 6) % 6), the indices of r, g and b into (v, p, q, t)
+_HSV_SECTOR_CHANNELS = ((0, 3, 1), (2, 0, 1), (1, 0, 3), (1, 2, 0), (3, 1, 0), (0, 1, 2))
+
+
+def _hsv_to_rgb_u8(h: float, s: float, v: float) -> Tuple[int, int, int]:
+    """
+    Straight-line version of colorsys.hsv_to_rgb that returns 0-255 ints
+    :param h: hue, in [0, 1]
+    :param s: saturation, in [0, 1]
+    :param v: value, in [0, 1]
+    :return: the (r, g, b) color, each in [0, 255]
+    """
+    if s == 0:
+        c = int(v * 255)
+        return c, c, c
+    h6 = h * 6
+    sector = int(h6)
+    f = h6 - sector
+    # v, p, q and t, in that order
+    channels = (v, v * (1 - s), v * (1 - s * f), v * (1 - s * (1 - f)))
+    r, g, b = _HSV_SECTOR_CHANNELS[sector % 6]
+    return int(channels[r] * 255), int(channels[g] * 255), int(channels[b] * 255)
+
+
 class Visualizer:
+    # Maximum number of hsv -> rgb conversions remembered across frames before starting over
+    _MAX_CACHED_RGBS = 1 << 16
+
     def __init__(self, light_show: LightShow):
         self._light_show = light_show
         self._beginning_time = time.time()
+        self._rgbs: Dict[HSV, Tuple[int, int, int]] = {}
 
-    def start(self, start_time: int = 0, number_of_circles=None) -> None:
+    def start(self, start_time: int = 0, number_of_circles=None, fps: float = 60) -> None:
         """
         :param start_time: time to start playing at, in millis
         :param number_of_circles:
+        :param fps: the maximum number of frames drawn per second
         """
         window = pyglet.window.Window(resizable=True)
         self._beginning_time = time.time() - start_time / 1000
@@ -23,11 +52,7 @@ class Visualizer:
 
         circles = []
 
-        max_light_index = 0
-
-        for light in self._light_show.all_lights:
-            if light.light_number > max_light_index:
-                max_light_index = light.light_number
+        max_light_index = max((light.light_number for light in self._light_show.all_lights), default=0)
 
         num_circles = max_light_index + 1
         if number_of_circles is not None:
@@ -36,32 +61,31 @@ class Visualizer:
         min_dimension = min(window.width, window.height)
         padding = 10
         circles_per_row = math.ceil(math.sqrt(num_circles))
+        # (column, row) of each circle, which only depends on the number of circles and not the window size
+        grid_positions = [(i % circles_per_row, i // circles_per_row)
+                          for i in range(num_circles)]
         circle_radius = (min_dimension - padding * 2) / (circles_per_row * 2)
-        circle_diameter = (min_dimension - padding * 2) / \
-            (circles_per_row * 2) * 2
-        for i in range(num_circles):
-            circles.append(shapes.Circle(circle_diameter * (i % circles_per_row) + circle_radius + padding,
-                                         circle_diameter *
-                                         (i // circles_per_row) +
-                                         circle_radius + padding,
+        circle_diameter = circle_radius * 2
+        for column, row in grid_positions:
+            circles.append(shapes.Circle(circle_diameter * column + circle_radius + padding,
+                                         circle_diameter * row + circle_radius + padding,
                                          radius=circle_radius, batch=batch,
                                          color=(10, 10, 10)))
 
+        # the color each circle was last set to; setting a circle's color re-uploads its vertices,
+        # so draw only touches the circles whose color actually changed
+        prev_colors = [(10, 10, 10)] * num_circles
+
         @window.event
         def on_resize(width, height):
             min_dimension = min(width, height)
-            padding = 10
-            circles_per_row = math.ceil(math.sqrt(num_circles))
             circle_radius = (min_dimension - padding * 2) / \
                 (circles_per_row * 2)
-            circle_diameter = (min_dimension - padding * 2) / \
-                (circles_per_row * 2) * 2
-            for i in range(num_circles):
-                circle = circles[i]
-                circle.x = circle_diameter * \
-                    (i % circles_per_row) + circle_radius + padding
-                circle.y = circle_diameter * \
-                    (i // circles_per_row) + circle_radius + padding
+            circle_diameter = circle_radius * 2
+            offset = circle_radius + padding
+            for circle, (column, row) in zip(circles, grid_positions):
+                circle.x = circle_diameter * column + offset
+                circle.y = circle_diameter * row + offset
                 circle.radius = circle_radius
 
         @window.event
@@ -71,32 +95,64 @@ class Visualizer:
 
                 for circle in circles:
                     circle.color = (10, 10, 10)
+                prev_colors[:] = [(10, 10, 10)] * num_circles
+
+        # whether the window is currently shown (i.e. not minimized), since nothing needs to be drawn otherwise
+        window_shown = True
+
+        @window.event
+        def on_show():
+            nonlocal window_shown
+            window_shown = True
+
+        @window.event
+        def on_hide():
+            nonlocal window_shown
+            window_shown = False
+
+        show_start = self._light_show.start
+        show_end = self._light_show.end
 
         def draw(delta):
+            if not window_shown:
+                return
+
             current_time = time.time()
             delta_time = (current_time - self._beginning_time) * \
                 1000  # since we want milliseconds
 
-            for circle in circles:
-                circle.color = (10, 10, 10)
-
-            lighting_info = self._light_show.get_info_at(delta_time)
-
+            if show_start <= delta_time <= show_end:
+                lighting_info = self._light_show.get_info_at(delta_time)
+            else:
+                # no lights are controlled outside of the show (i.e. once it has ended), so it isn't sampled
+                lighting_info = {}
+
+            # single pass over the frame, writing straight into the per-circle colors.
+            # Lights very often share a color, and shows tend to repeat colors from frame to frame,
+            # so each distinct hsv is only converted (and checked) once
+            rgbs = self._rgbs
+            if len(rgbs) > Visualizer._MAX_CACHED_RGBS:
+                rgbs.clear()
+            new_colors = [(10, 10, 10)] * num_circles
             for lightObj, hsv_info in lighting_info.items():
                 hsv = hsv_info.hsv
-                assert not (
-                    hsv.h is None or hsv.s is None or hsv.v is None),\
-                    f'something bad, got {hsv.h},{hsv.s},{hsv.v} at timestamp {delta_time}'
-                r, g, b = colorsys.hsv_to_rgb(hsv.h, hsv.s, hsv.v)
-                r = int(r * 255)
-                g = int(g * 255)
-                b = int(b * 255)
-                circles[lightObj.light_number].color = (r, g, b)
+                rgb = rgbs.get(hsv)
+                if rgb is None:
+                    assert not (
+                        hsv.h is None or hsv.s is None or hsv.v is None),\
+                        f'something bad, got {hsv.h},{hsv.s},{hsv.v} at timestamp {delta_time}'
+                    rgb = rgbs[hsv] = _hsv_to_rgb_u8(*hsv)
+                new_colors[lightObj.light_number] = rgb
+
+            for i, (old, new) in enumerate(zip(prev_colors, new_colors)):
+                if old != new:
+                    circles[i].color = new
+                    prev_colors[i] = new
 
             window.clear()
             batch.draw()
 
-        pyglet.clock.schedule(draw)
+        pyglet.clock.schedule_interval(draw, 1.0 / fps)
 
         pyglet.app.run()
 
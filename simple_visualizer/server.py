@@ -1,9 +1,10 @@
+import io
 import pickle
 from pathlib import Path
 from random import randint, random
 from typing import Dict, Any, List
 import json
-from bottle import route, run, template, static_file, post, request
+from bottle import route, run, template, static_file, post, request, HTTPResponse
 from scipy import rand
 from lightshow import compiler_examples
 from lightshow.core.lightshows import WithAlbumArtColors
@@ -20,6 +21,9 @@ class SimpleServer:
                  audio_metadata: Optional[Dict[str, Any]] = None):
         self._lightshow = lightshow
         self._audio_metadata = audio_metadata
+        # the show and its audio metadata never change, so the show is only compiled (in memory) for the first
+        # request, and later requests are served the same csv
+        self._compiled_csv: Optional[bytes] = None
 
         @route("/public/<filename>")
         def handle_public_file(filename):
@@ -30,15 +34,16 @@ class SimpleServer:
 
         @route("/get-data")
         def handle_get_data():
-            if self._audio_metadata is not None:
-                show = self._lightshow.with_audio(0, **self._audio_metadata)
-            else:
-                show = self._lightshow
-            compiled_path = str(Path(__file__).parent.absolute()) + "/compiled.csv"
-            compiler_examples.compile_to_csv(show, 30, compiled_path)
-            result = static_file(compiled_path, root="/")
-            result.set_header("Cache-Control", "no-cache")
-            return result
+            if self._compiled_csv is None:
+                if self._audio_metadata is not None:
+                    show = self._lightshow.with_audio(0, **self._audio_metadata)
+                else:
+                    show = self._lightshow
+                compiled_csv = io.BytesIO()
+                compiler_examples.compile_to_csv(show, 30, compiled_csv)
+                self._compiled_csv = compiled_csv.getvalue()
+            return HTTPResponse(self._compiled_csv, headers={"Content-Type": "text/csv",
+                                                             "Cache-Control": "no-cache"})
 
         run(host="0.0.0.0", port=port)
 
@@ -0,0 +1,107 @@
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+
+from lightshow import compiler_examples
+from lightshow.lighting_language import *
+from lightshow.geometry.lighting_components import LightStrip, SingleLight, LightingComponentGroup
+from lightshow.geometry.shapes import Sphere, GrowingAndShrinkingSphere, CompositeShape
+
+
+def _example_shows():
+    strip = LightStrip([Light(i) for i in range(30)])
+    group = LightingComponentGroup([strip,
+                                    SingleLight(Light(40), Point(5, 1, 0)),
+                                    LightStrip([Light(50 + i) for i in range(5)], Point(0, 0, 0), Point(0, 4, 2))])
+    return {
+        "fade": fade(HSV(.3, 1, 0), HSV(.6, .5, 1), 1000, {Light(i) for i in range(10)}),
+        "fade_v": fade(HSV(None, None, 0), HSV(None, None, 1), 700, {Light(1), Light(2, universe=1)}),
+        "strobe": strobe(HSV(0, 1, 1), HSV(0, 0, 0), 2000, {Light(3), Light(4)}, frequency=7),
+        "counting": together([at(i * 50, concat([fade(HSV(.3, 1, 0), HSV(.3, 1, 1), 500, {Light(i)}),
+                                                 fade(HSV(.6, 1, 1), HSV(.6, 1, 0), 500, {Light(i)})]))
+                              for i in range(40)]),
+        "layered": together([with_importance(1, constant(HSV(.1, .2, .3), 800, {Light(1), Light(2)})),
+                             fade(HSV(.5, .5, .5), HSV(.9, .1, .2), 1200, {Light(2), Light(3)}),
+                             during(100, 600, strobe(HSV(None, None, 1), HSV(None, None, 0), 900,
+                                                     {Light(1), Light(3)}, frequency=11))]),
+        "repeat": repeat_at([0, 100, 250, 700], fade(HSV(0, 1, 1), HSV(.5, 1, 0), 300, {Light(0), Light(1)})),
+        "onshape_comp": on_shape(CompositeShape([Sphere(3, Point(4, 0, 0)),
+                                                 Sphere(5, Point(20, 0, 0)),
+                                                 GrowingAndShrinkingSphere(4, 1, 500, Point(2, 2, 1))]),
+                                 group, fade(HSV(.2, 1, 1), HSV(.8, 1, .3), 1500)),
+        "grow": on_shape(GrowingAndShrinkingSphere(8, 2, 400, Point(15, 0, 0)), strip,
+                         constant(HSV(.4, .4, 1), 1300)),
+        "mover": back_and_forth(Point(0, 0, 0), Point(30, 0, 0), 600, Sphere(4), constant(HSV(.7, 1, 1), 2000),
+                                group),
+    }
+
+
+# sha1 of the (normalized) csv each example show compiles to at 30hz and at 60hz
+_EXPECTED_DIGESTS = {
+    "fade": ("6e6e927800bcd436ed8b5a0f0c88329375e7fc8f",
+             "f113e1c43942d9c3f9b0126189afca6ed93bc037"),
+    "fade_v": ("760e079cec6023788c88e28d28759944c7fc5b91",
+               "2e4de6cd13a4c008f8d329f0835e5d383d011285"),
+    "strobe": ("867638a54da9dd13aba25dc36c85211989c1e4c6",
+               "850cc51582e36cd053b553196b968865651b33c6"),
+    "counting": ("1cb5cc991bcfecb835893ba40c527ae31ee98c0c",
+                 "3834009f1c9913a316a617f7b4088f1f527de34e"),
+    "layered": ("523945019e1646152a28d248a5675d3f6e079e5f",
+                "4e8b57a860c443a8ac5dae69b339eec51034cddf"),
+    "repeat": ("e7889a867613d3de3c1a3618408818809f712997",
+               "08a500408368d141ec37df09cef7b993321c30ce"),
+    "onshape_comp": ("eb2ddb664cb7ae57f0957ce4fd2a875f6e265a98",
+                     "9908666acdaa2ffcb9680adfcfc317319206acb5"),
+    "grow": ("215f5e971230da0b2de5c8c9c3045d566c5534a5",
+             "49813def5f35b24f5c4ce667dd6be4146cd20f98"),
+    "mover": ("1e095ffc3c6bbb176b973046ce198a4cd40bb498",
+              "f7b385192d31726c37865695186f8b7a7a0296af"),
+}
+
+
+def _normalized(csv: bytes) -> bytes:
+    """
+    :return: <csv> with the lights of each row sorted, since the order lights are written in isn't specified
+    """
+    rows = []
+    for row in csv.split(b"\n"):
+        cells = row.split(b",")
+        lights = sorted(b",".join(cells[i:i + 4]) for i in range(1, len(cells), 4))
+        rows.append(b",".join([cells[0]] + lights))
+    return b"\n".join(rows)
+
+
+def _compile(show, frequency, universe=0, processes=None) -> bytes:
+    output = io.BytesIO()
+    compiler_examples.compile_to_csv(show, frequency, output, universe=universe, processes=processes)
+    return output.getvalue()
+
+
+class CompilerTest(unittest.TestCase):
+
+    def test_example_shows_compile_to_expected_csvs(self):
+        for name, show in _example_shows().items():
+            digests = tuple(hashlib.sha1(_normalized(_compile(show, frequency))).hexdigest() for frequency in [30, 60])
+            self.assertEqual(digests, _EXPECTED_DIGESTS[name], name)
+
+    def test_only_lights_in_universe(self):
+        show = _example_shows()["fade_v"]
+        for row in _compile(show, 30, universe=1).splitlines():
+            self.assertEqual(row.split(b",")[1::4], [b"2"])
+
+    def test_outputs_agree(self):
+        for name, show in _example_shows().items():
+            expected = _compile(show, 60)
+            self.assertEqual(_compile(show, 60, processes=2), expected, name)
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "show.csv")
+                compiler_examples.compile_to_csv(show, 60, path)
+                with open(path, "rb") as csv_file:
+                    self.assertEqual(csv_file.read(), expected, name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import io
+import random
+import unittest
+
+from lightshow import compiler_examples
+from lightshow.lighting_language import *
+
+
+class FadeTest(unittest.TestCase):
+
+    def test_compiled_constant_never_changes(self):
+        output = io.BytesIO()
+        compiler_examples.compile_to_csv(constant(HSV(.4, .4, .4), 1000), 1000, output)
+
+        # every row but the last (which turns the lights off) is <timestamp>,<light cells>
+        rows = output.getvalue().decode().splitlines()[:-1]
+        self.assertEqual({row.split(",", 1)[1] for row in rows}, {"0,102,102,102"})
+
+    def test_get_infos_at_matches_get_info_at(self):
+        random.seed(0)
+        for _ in range(50):
+            show = fade(HSV(random.random(), random.random(), random.random()),
+                        HSV(random.random(), random.random(), random.random()),
+                        random.choice([1000, 700, 333.3]), {Light(0), Light(1)})
+            timestamps = [random.uniform(show.start - 10, show.end + 10) for _ in range(200)]
+            self.assertEqual(show.get_infos_at(timestamps), [show.get_info_at(t) for t in timestamps])
+
+
+if __name__ == "__main__":
+    unittest.main()
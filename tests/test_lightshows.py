@@ -0,0 +1,158 @@
+import random
+import unittest
+from unittest import mock
+
+from lightshow.lighting_language import *
+from lightshow.core.lightshows import Mover, Together
+from lightshow.core.utils import resolve_two_infos
+from lightshow.geometry.lighting_components import LightStrip
+from lightshow.geometry.shapes import Sphere
+
+
+def _boundary_timestamps(show, margin=12, step=.5):
+    """
+    :return: timestamps every <step> ms within <margin> ms of the start and end of <show>
+    """
+    count = int(2 * margin / step) + 1
+    return [show.start - margin + i * step for i in range(count)] \
+        + [show.end - margin + i * step for i in range(count)]
+
+
+def _brute_force_together(shows, timestamp):
+    """
+    Samples every show in <shows> (where nested lists are played together) and resolves conflicts in order, the way
+    Together did before it flattened nested shows or skipped the ones that aren't playing
+    """
+    output = {}
+    for show in shows:
+        info = _brute_force_together(show, timestamp) if isinstance(show, list) else show.get_info_at(timestamp)
+        for light, hsv_info in info.items():
+            output[light] = resolve_two_infos(output[light], hsv_info) if light in output else hsv_info
+    return output
+
+
+def _together_of_lists(shows):
+    return together([_together_of_lists(show) if isinstance(show, list) else show for show in shows])
+
+
+class TogetherTest(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        random.seed(0)
+        lights = [Light(i) for i in range(4)]
+
+        def random_show():
+            start = random.uniform(-200, 800)
+            length = random.uniform(10, 400)
+            show_lights = set(random.sample(lights, random.randint(1, 3)))
+            show = fade(HSV(random.random(), 1, 1), HSV(random.random(), 1, 0), length, show_lights)
+            return at(start, with_importance(random.randint(0, 2), show))
+
+        for _ in range(20):
+            shows = [random_show() for _ in range(4)] + [[random_show() for _ in range(3)], [random_show()]]
+            show = _together_of_lists(shows)
+            for t in [random.uniform(show.start - 20, show.end + 20) for _ in range(200)] + [show.start, show.end]:
+                self.assertEqual(show.get_info_at(t), _brute_force_together(shows, t), t)
+
+    def test_nested_togethers_are_flattened(self):
+        shows = [constant(HSV(.1, 1, 1), 100, {Light(i)}) for i in range(4)]
+        show = together([together(shows[:2]), shows[2], together([together([shows[3]])])])
+        self.assertIsInstance(show, Together)
+        self.assertEqual(show._lightshows, shows)
+
+
+class ConcatTest(unittest.TestCase):
+
+    def test_matches_together_of_ats(self):
+        shows = [fade(HSV(.1, 1, 1), HSV(.2, 1, 0), 300, {Light(1)}),
+                 with_importance(1, constant(HSV(.5, 1, 1), 120, {Light(1), Light(2)})),
+                 strobe(HSV(.9, 1, 1), HSV(.9, 1, 0), 500, {Light(2)}, frequency=9)]
+        show = concat(shows)
+
+        offset = 0
+        ats = []
+        for lightshow in shows:
+            ats.append(at(offset, lightshow))
+            offset += lightshow.length
+        expected_show = together(ats)
+
+        self.assertEqual((show.start, show.end), (expected_show.start, expected_show.end))
+        # includes the timestamps right at the boundaries, where two shows are playing
+        for t in [show.start - 1 + i * .5 for i in range(int(show.length * 2) + 4)] + [300, 420]:
+            self.assertEqual(show.get_info_at(t), expected_show.get_info_at(t), t)
+
+
+class StrobeTest(unittest.TestCase):
+
+    def test_get_infos_at_matches_get_info_at(self):
+        random.seed(0)
+        for show in [strobe(HSV(0, 1, 1), HSV(0, 0, 0), 2000, {Light(3), Light(4)}, frequency=7),
+                     strobe(HSV(None, None, 1), HSV(None, None, 0), 1000, {Light(1)}, time_high=30, time_low=70)]:
+            timestamps = [random.uniform(show.start - 10, show.end + 10) for _ in range(300)]
+            self.assertEqual(show.get_infos_at(timestamps), [show.get_info_at(t) for t in timestamps])
+
+
+class CachedLruTest(unittest.TestCase):
+
+    def test_matches_rounded_show(self):
+        show = fade(HSV(.1, 1, 1), HSV(.4, 1, 0), 500, {Light(1)})
+        cached_show = Cached(show, quantum=20, max_entries=4)
+        for t in [i * 3.3 for i in range(152)] * 2:
+            self.assertEqual(cached_show.get_info_at(t), show.get_info_at(round(t / 20) * 20), t)
+            self.assertLessEqual(len(cached_show._output_cache), 4)
+
+
+class MoverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.strip = LightStrip([Light(i) for i in range(10)])
+        # starts and ends on the 10ms steps the mover is sampled at, so timestamps just outside of it round into it
+        self.mover = back_and_forth(Point(0, 0, 0), Point(10, 0, 0), 300, Sphere(3),
+                                    constant(HSV(.7, 1, 1), 1000), self.strip)
+
+    def test_nothing_outside_of_bounds(self):
+        for t in _boundary_timestamps(self.mover):
+            if t < self.mover.start or t > self.mover.end:
+                self.assertEqual(self.mover.get_info_at(t), {}, t)
+
+    def test_together_matches_mover_at_bounds(self):
+        other = constant(HSV(.2, 1, 1), 2000, {Light(20)})
+        show = together([self.mover, other])
+        for t in _boundary_timestamps(self.mover):
+            expected = dict(other.get_info_at(t))
+            expected.update(self.mover.get_info_at(t))
+            self.assertEqual(show.get_info_at(t), expected, t)
+
+    def test_evicted_outputs_are_the_same(self):
+        timestamps = [i * 7.3 for i in range(138)]
+        expected = [self.mover.get_info_at(t) for t in timestamps]
+
+        with mock.patch.object(Mover, "_MAX_CACHED_OUTPUTS", 4):
+            mover = back_and_forth(Point(0, 0, 0), Point(10, 0, 0), 300, Sphere(3),
+                                   constant(HSV(.7, 1, 1), 1000), self.strip)
+            for _ in range(2):
+                self.assertEqual([mover.get_info_at(t) for t in timestamps], expected)
+                self.assertLessEqual(len(mover._output_cache), 4)
+
+
+class CachedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cached = cached(fade(HSV(.1, 1, 1), HSV(.4, 1, 0), 500, {Light(1)}), quantum=20)
+
+    def test_nothing_outside_of_bounds(self):
+        for t in _boundary_timestamps(self.cached):
+            if t < self.cached.start or t > self.cached.end:
+                self.assertEqual(self.cached.get_info_at(t), {}, t)
+
+    def test_concat_matches_cached_at_bounds(self):
+        second = constant(HSV(.2, 1, 1), 300, {Light(2)})
+        show = concat([self.cached, second])
+        for t in _boundary_timestamps(self.cached):
+            expected = dict(self.cached.get_info_at(t))
+            expected.update(second.get_info_at(t - self.cached.length))
+            self.assertEqual(show.get_info_at(t), expected, t)
+
+
+if __name__ == "__main__":
+    unittest.main()
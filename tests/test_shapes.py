@@ -0,0 +1,84 @@
+import random
+import unittest
+from fractions import Fraction
+
+from lightshow.geometry.shapes import *
+
+
+def _union_in_shape(shapes, p, t=0):
+    """
+    The union of <shapes> at <p>, checked shape by shape (i.e. without any of CompositeShape's fast paths)
+    """
+    output_is_in_shape = False
+    output_density = 0
+    for shape in shapes:
+        is_in_shape, density = shape.point_in_shape(p, t)
+        if is_in_shape:
+            output_is_in_shape = True
+            output_density = max(density, output_density)
+    return output_is_in_shape, output_density
+
+
+class SpheresUnionTest(unittest.TestCase):
+
+    def test_matches_each_sphere(self):
+        random.seed(0)
+        spheres = [Sphere(random.uniform(.5, 3), Point(random.uniform(-3, 3), random.uniform(-3, 3), 0))
+                   for _ in range(5)]
+        composite = CompositeShape(spheres)
+
+        points = [Point(random.uniform(-7, 7), random.uniform(-7, 7), random.uniform(-1, 1)) for _ in range(500)]
+        # points exactly on the boundary and at the origin of each sphere
+        points += [Point(sphere._ox + sphere._radius, sphere._oy, sphere._oz) for sphere in spheres]
+        points += [sphere._origin for sphere in spheres]
+
+        expected = [_union_in_shape(spheres, p) for p in points]
+        self.assertEqual([composite.point_in_shape(p) for p in points], expected)
+        self.assertEqual(composite.points_in_shape([p.x for p in points], [p.y for p in points],
+                                                   [p.z for p in points]), expected)
+        self.assertTrue(any(is_in_shape for is_in_shape, _ in expected))
+        self.assertTrue(not all(is_in_shape for is_in_shape, _ in expected))
+
+    def test_non_float_values(self):
+        spheres = [Sphere(Fraction(3, 2), Point(Fraction(1, 3), 0, 0)), Sphere(1, Point(2, 0, 0))]
+        is_in_shape, density = CompositeShape(spheres).point_in_shape(Point(.5, 0, 0))
+        self.assertTrue(is_in_shape)
+        self.assertAlmostEqual(density, 8 / 9)
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(1)
+        self.shapes = [
+            Sphere(2, Point(1, 0, 0)),
+            Cube(Point(-1, -2, 0), Point(1, 2, 1)),
+            GrowingAndShrinkingSphere(4, 1, 500, Point(0, 1, 0)),
+            CompositeShape([Sphere(1, Point(-2, 0, 0)),
+                            GrowingAndShrinkingSphere(3, 2, 300),
+                            Cube(Point(2, 2, 2), Point(3, 3, 3))]),
+        ]
+        self.points = [Point(random.uniform(-5, 5), random.uniform(-5, 5), random.uniform(-3, 3)) for _ in range(400)]
+
+    def test_points_in_shape_matches_point_in_shape(self):
+        xs, ys, zs = [p.x for p in self.points], [p.y for p in self.points], [p.z for p in self.points]
+        for shape in self.shapes:
+            for t in [0, 60, 125, 250, 437.5]:
+                self.assertEqual(shape.points_in_shape(xs, ys, zs, t),
+                                 [shape.point_in_shape(p, t) for p in self.points], (shape, t))
+
+    def test_bounding_cube_at_contains_shape(self):
+        for shape in self.shapes:
+            cube = shape.bounding_cube()
+            for t in [0, 60, 125, 250, 437.5]:
+                cube_at_t = shape.bounding_cube_at(t)
+                self.assertTrue(cube.x1 <= cube_at_t.x1 and cube_at_t.x2 <= cube.x2
+                                and cube.y1 <= cube_at_t.y1 and cube_at_t.y2 <= cube.y2
+                                and cube.z1 <= cube_at_t.z1 and cube_at_t.z2 <= cube.z2, (shape, t))
+                for p in self.points:
+                    if shape.point_in_shape(p, t)[0]:
+                        self.assertTrue(cube_at_t.point_in_shape(p)[0], (shape, t, p))
+
+
+if __name__ == "__main__":
+    unittest.main()